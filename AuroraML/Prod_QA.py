@@ -0,0 +1,312 @@
+# This file contains production QA: reference feature histograms and drift monitoring of scoring batches.
+import json
+import logging
+import os
+import warnings
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import average_precision_score, roc_auc_score
+
+
+class FeatureHistograms:
+    """
+    Per-feature histograms over fixed bins, updated batch by batch in bounded memory.
+
+    Numeric features are binned on quantile edges of the reference data, with one extra
+    bin for missing values. Categorical features count their most frequent reference
+    levels, all other levels together, and missing values. Only the counts are kept,
+    so memory depends on the number of features and bins, not on the number of rows.
+    """
+
+    # numeric values compared against the bin edges at once, bounds the temporary memory
+    BLOCK_CELLS = 20_000_000
+
+    def __init__(self, numeric_columns, edges, categorical_columns, categories):
+        """
+        Initializes empty histograms over the given bins.
+
+        Args:
+            numeric_columns (list): Names of the numeric features.
+            edges (np.ndarray): Inner bin edges, one column per numeric feature.
+            categorical_columns (list): Names of the categorical features.
+            categories (dict): Counted levels of each categorical feature.
+        """
+        self.numeric_columns = list(numeric_columns)
+        self.edges = np.asarray(edges, dtype=np.float64).reshape(-1, len(self.numeric_columns))
+        self.categorical_columns = list(categorical_columns)
+        self.categories = {col: list(categories[col]) for col in self.categorical_columns}
+
+        # numeric: one bin per edge interval plus missing; categorical: levels, other, missing
+        self.n_cat_bins = max((len(levels) for levels in self.categories.values()), default=0) + 2
+        self.numeric_counts = np.zeros((len(self.numeric_columns), self.edges.shape[0] + 2), dtype=np.int64)
+        self.categorical_counts = np.zeros((len(self.categorical_columns), self.n_cat_bins), dtype=np.int64)
+        self.n_rows = 0
+
+    @classmethod
+    def fit(cls, df, n_bins=20, max_categories=20):
+        """
+        Builds reference histograms of a feature snapshot, e.g. the training features.
+
+        Args:
+            df (pd.DataFrame): The reference features.
+            n_bins (int): Number of quantile bins of each numeric feature.
+            max_categories (int): Number of most frequent levels counted per categorical feature.
+
+        Returns:
+            FeatureHistograms: Histograms with the reference counts.
+        """
+        numeric_columns = df.select_dtypes(include=[np.number, "bool"]).columns.tolist()
+        categorical_columns = [col for col in df.columns if col not in numeric_columns]
+
+        values = df[numeric_columns].to_numpy(dtype=np.float64, na_value=np.nan)
+        quantiles = np.linspace(0, 1, n_bins + 1)[1:-1]
+        if values.size:
+            with warnings.catch_warnings():
+                # all-missing features are handled below
+                warnings.simplefilter("ignore", RuntimeWarning)
+                edges = np.nanquantile(values, quantiles, axis=0)
+        else:
+            edges = np.full((len(quantiles), len(numeric_columns)), np.nan)
+        # all-missing features have no edges, every value then falls in the first bin
+        edges = np.nan_to_num(edges, nan=np.inf)
+
+        categories = {
+            col: df[col].value_counts(dropna=True).index[:max_categories].astype(str).tolist()
+            for col in categorical_columns
+        }
+
+        reference = cls(numeric_columns, edges, categorical_columns, categories)
+        reference.update(df)
+        return reference
+
+    def empty_like(self):
+        """
+        Returns:
+            FeatureHistograms: Histograms over the same bins with zero counts.
+        """
+        return FeatureHistograms(self.numeric_columns, self.edges, self.categorical_columns, self.categories)
+
+    def update(self, df):
+        """
+        Adds a batch of rows to the counts.
+
+        Args:
+            df (pd.DataFrame): A batch of features. Missing feature columns count as missing values.
+
+        Returns:
+            FeatureHistograms: self.
+        """
+        n_rows = len(df)
+        if self.numeric_columns:
+            values = df.reindex(columns=self.numeric_columns).to_numpy(dtype=np.float64, na_value=np.nan)
+            n_edges = self.edges.shape[0]
+            n_bins = n_edges + 2
+            block_rows = max(1, self.BLOCK_CELLS // max(1, n_edges * len(self.numeric_columns)))
+            column_offsets = np.arange(len(self.numeric_columns)) * n_bins
+
+            for start in range(0, n_rows, block_rows):
+                block = values[start:start + block_rows]
+                # bin of each value is the number of edges below it, the last bin holds missing values
+                codes = (block[:, None, :] > self.edges[None, :, :]).sum(axis=1)
+                codes[np.isnan(block)] = n_bins - 1
+                self.numeric_counts += np.bincount(
+                    (codes + column_offsets).ravel(), minlength=len(self.numeric_columns) * n_bins
+                ).reshape(len(self.numeric_columns), n_bins)
+
+        for i, col in enumerate(self.categorical_columns):
+            levels = self.categories[col]
+            if col in df.columns:
+                series = df[col]
+                codes = pd.Categorical(series.astype(str), categories=levels).codes.astype(np.int64)
+                codes[codes < 0] = len(levels)
+                codes[series.isna().to_numpy()] = self.n_cat_bins - 1
+            else:
+                codes = np.full(n_rows, self.n_cat_bins - 1)
+            self.categorical_counts[i] += np.bincount(codes, minlength=self.n_cat_bins)
+
+        self.n_rows += n_rows
+        return self
+
+    def save(self, path):
+        """
+        Saves the bins and counts as JSON.
+
+        Args:
+            path (str): File to write.
+        """
+        state = {
+            "numeric_columns": self.numeric_columns,
+            "edges": np.where(np.isinf(self.edges), None, self.edges).tolist(),
+            "categorical_columns": self.categorical_columns,
+            "categories": self.categories,
+            "numeric_counts": self.numeric_counts.tolist(),
+            "categorical_counts": self.categorical_counts.tolist(),
+            "n_rows": self.n_rows,
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads histograms saved by save().
+
+        Args:
+            path (str): The saved file.
+
+        Returns:
+            FeatureHistograms: The saved bins and counts.
+        """
+        with open(path) as f:
+            state = json.load(f)
+
+        edges = np.array(state["edges"], dtype=np.float64).reshape(-1, len(state["numeric_columns"]))
+        histograms = cls(state["numeric_columns"], np.nan_to_num(edges, nan=np.inf),
+                         state["categorical_columns"], state["categories"])
+        histograms.numeric_counts += np.array(state["numeric_counts"], dtype=np.int64).reshape(
+            histograms.numeric_counts.shape)
+        histograms.categorical_counts += np.array(state["categorical_counts"], dtype=np.int64).reshape(
+            histograms.categorical_counts.shape)
+        histograms.n_rows = state["n_rows"]
+        return histograms
+
+
+class DriftMonitor:
+    """
+    Compares scoring batches to reference histograms with PSI and KS per feature.
+
+    PSI is computed on the reference bins, including the missing and other-level bins.
+    KS is the largest gap between the binned cumulative distributions of the non-missing
+    values of numeric features. It is a lower bound of the exact two-sample KS statistic,
+    tight to about 1 / n_bins.
+    """
+
+    def __init__(self, reference, psi_threshold=0.2, ks_threshold=0.1, epsilon=1e-4):
+        """
+        Initializes the monitor with empty current counts.
+
+        Args:
+            reference (FeatureHistograms): Histograms of the training features.
+            psi_threshold (float): Features with a PSI above this are flagged.
+            ks_threshold (float): Numeric features with a KS above this are flagged.
+            epsilon (float): Share given to empty bins so PSI stays finite.
+        """
+        self.reference = reference
+        self.current = reference.empty_like()
+        self.psi_threshold = psi_threshold
+        self.ks_threshold = ks_threshold
+        self.epsilon = epsilon
+
+    def update(self, batch):
+        """
+        Adds a scoring batch to the current counts.
+
+        Args:
+            batch (pd.DataFrame): Features of the batch.
+        """
+        self.current.update(batch)
+
+    def monitor_file(self, file_path, chunksize=100_000):
+        """
+        Streams a feature file into the current counts and reports drift.
+
+        Args:
+            file_path (str): CSV of scoring features.
+            chunksize (int): Number of rows read at a time.
+
+        Returns:
+            pd.DataFrame: See get_report().
+        """
+        for chunk in pd.read_csv(file_path, chunksize=chunksize):
+            self.update(chunk)
+        logging.info(f"Monitored {self.current.n_rows} rows from {file_path}.")
+        return self.get_report()
+
+    def _get_psi(self, ref_counts, cur_counts):
+        ref_share = ref_counts / np.maximum(ref_counts.sum(axis=1, keepdims=True), 1)
+        cur_share = cur_counts / np.maximum(cur_counts.sum(axis=1, keepdims=True), 1)
+        ref_share = np.maximum(ref_share, self.epsilon)
+        cur_share = np.maximum(cur_share, self.epsilon)
+        return np.sum((cur_share - ref_share) * np.log(cur_share / ref_share), axis=1)
+
+    def get_report(self):
+        """
+        Computes drift of every feature between the reference and the batches seen so far.
+
+        Returns:
+            pd.DataFrame: Per feature its type, PSI, KS (NaN for categorical features), missing
+                rates of the reference and the current data, and a drift flag, sorted by PSI.
+        """
+        ref, cur = self.reference, self.current
+
+        # numeric features, last bin holds missing values
+        ref_num, cur_num = ref.numeric_counts, cur.numeric_counts
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ref_cdf = np.cumsum(ref_num[:, :-1], axis=1) / ref_num[:, :-1].sum(axis=1, keepdims=True)
+            cur_cdf = np.cumsum(cur_num[:, :-1], axis=1) / cur_num[:, :-1].sum(axis=1, keepdims=True)
+        ks = np.nanmax(np.abs(ref_cdf - cur_cdf), axis=1, initial=0.0) if len(ref_num) else np.zeros(0)
+
+        numeric = pd.DataFrame({
+            "feature": ref.numeric_columns,
+            "type": "numeric",
+            "psi": self._get_psi(ref_num, cur_num),
+            "ks": ks,
+            "missing_rate_reference": ref_num[:, -1] / max(ref.n_rows, 1),
+            "missing_rate_current": cur_num[:, -1] / max(cur.n_rows, 1),
+        })
+
+        # categorical features, last bin holds missing values
+        ref_cat, cur_cat = ref.categorical_counts, cur.categorical_counts
+        categorical = pd.DataFrame({
+            "feature": ref.categorical_columns,
+            "type": "categorical",
+            "psi": self._get_psi(ref_cat, cur_cat),
+            "ks": np.nan,
+            "missing_rate_reference": ref_cat[:, -1] / max(ref.n_rows, 1),
+            "missing_rate_current": cur_cat[:, -1] / max(cur.n_rows, 1),
+        })
+
+        report = pd.concat([numeric, categorical], ignore_index=True)
+        report["drift"] = (report["psi"] > self.psi_threshold) | (report["ks"] > self.ks_threshold)
+        report = report.sort_values("psi", ascending=False).set_index("feature")
+
+        n_drift = int(report["drift"].sum())
+        if n_drift:
+            logging.warning(f"Drift flagged on {n_drift} of {len(report)} features.")
+        return report
+
+
+def ouput_qa_artifacts(model, X_test, y_test, output_dir="qa_artifacts", reference_df=None):
+    """
+    Writes the QA artifacts of a trained model: test metrics and the reference feature histograms.
+
+    Args:
+        model: A fitted classifier or pipeline with predict_proba.
+        X_test (pd.DataFrame): Held out features.
+        y_test (pd.Series): Held out labels.
+        output_dir (str): Directory the artifacts are written to, created if missing.
+        reference_df (pd.DataFrame): Features the drift reference is built from, e.g. the
+            training features. X_test is used if None.
+
+    Returns:
+        dict: The test metrics.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    y_score = model.predict_proba(X_test)[:, 1]
+    metrics = {
+        "n_test": int(len(y_test)),
+        "roc_auc": float(roc_auc_score(y_test, y_score)),
+        "pr_auc": float(average_precision_score(y_test, y_score)),
+    }
+    with open(os.path.join(output_dir, "test_metrics.json"), "w") as f:
+        json.dump(metrics, f, indent=2)
+
+    reference = FeatureHistograms.fit(X_test if reference_df is None else reference_df)
+    reference.save(os.path.join(output_dir, "feature_reference.json"))
+
+    print(f"QA artifacts written to {output_dir}: ROC-AUC {metrics['roc_auc']:.4f}, PR-AUC {metrics['pr_auc']:.4f}.")
+    return metrics
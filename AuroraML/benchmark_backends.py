@@ -0,0 +1,51 @@
+# This file compares the fit time and AUC of the Model estimator backends on one split.
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from model import Model
+
+
+def make_synthetic_data(n_rows, n_features=50, random_state=42):
+    """
+    Creates a candidate table with numerical, binary and categorical features.
+
+    Args:
+        n_rows (int): Number of candidates.
+        n_features (int): Number of numerical features, a fifth as many binary features are added.
+        random_state (int): Seed of the generated data.
+
+    Returns:
+        pd.DataFrame: Features with a candidate_id and a target column.
+    """
+    rng = np.random.default_rng(random_state)
+    X = rng.normal(size=(n_rows, n_features))
+    df = pd.DataFrame(X, columns=[f"num_{i}" for i in range(n_features)])
+    for i in range(n_features // 5):
+        df[f"bin_{i}"] = (X[:, i] + rng.normal(size=n_rows) > 0).astype(float)
+    df["state"] = rng.choice(["CA", "NY", "TX", "WA"], size=n_rows)
+
+    logit = X[:, :5].sum(axis=1) + np.sin(X[:, 5] * 2) - 3
+    df["target"] = (rng.random(n_rows) < 1 / (1 + np.exp(-logit))).astype(int)
+    df["candidate_id"] = np.arange(n_rows)
+    return df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the Model estimator backends.")
+    parser.add_argument("--input", help="CSV of features with label and id columns, synthetic data if omitted.")
+    parser.add_argument("--rows", type=int, default=200_000, help="Number of synthetic candidates.")
+    parser.add_argument("--label-column", default="target")
+    parser.add_argument("--id-column", default="candidate_id")
+    parser.add_argument("--backends", nargs="+", default=list(Model.ESTIMATOR_BACKENDS))
+    parser.add_argument("--output", help="CSV the comparison table is written to.")
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.input) if args.input else make_synthetic_data(args.rows)
+    model = Model(df=df, label_column=args.label_column, id_column=args.id_column, log_transform_features=[])
+    results = model.benchmark_backends(args.backends)
+
+    print(results.to_string())
+    if args.output:
+        results.to_csv(args.output)
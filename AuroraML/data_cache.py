@@ -0,0 +1,138 @@
+# This file contains a columnar on-disk cache for parsed data files.
+import hashlib
+import json
+import logging
+import os
+
+import pandas as pd
+
+
+def hash_file(file_path, block_size=1 << 20):
+    """
+    Hashes the content of a file.
+
+    Args:
+        file_path (str): Path of the file to hash.
+        block_size (int): Number of bytes read at a time.
+
+    Returns:
+        str: The hex digest of the file content.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class DataCache:
+    """
+    A cache of parsed DataFrames stored as parquet files next to a JSON record of their source.
+
+    An entry is valid while its source file keeps the same path and content. Size and
+    mtime are checked first, the content is only re-hashed when they changed.
+    """
+
+    def __init__(self, cache_dir):
+        """
+        Initializes the cache in a local directory.
+
+        Args:
+            cache_dir (str): Directory holding the cached files, created if missing.
+        """
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def get_entry_paths(self, file_path, variant=""):
+        """
+        Returns the data and metadata paths of the cache entry for a source file.
+
+        Args:
+            file_path (str): Path of the source file.
+            variant (str): Anything else that changes the parsed result, e.g. the column renames.
+
+        Returns:
+            tuple: The parquet and JSON paths of the entry.
+        """
+        name = hashlib.blake2b(
+            f"{os.path.abspath(file_path)}|{variant}".encode(), digest_size=16
+        ).hexdigest()
+        return (
+            os.path.join(self.cache_dir, f"{name}.parquet"),
+            os.path.join(self.cache_dir, f"{name}.json"),
+        )
+
+    def get_source_meta(self, file_path, stored_meta=None):
+        """
+        Describes the current state of a source file.
+
+        Args:
+            file_path (str): Path of the source file.
+            stored_meta (dict): The metadata saved with the cache entry, if any. Its content
+                hash is reused when size and mtime did not change.
+
+        Returns:
+            dict: The path, size, mtime and content hash of the file.
+        """
+        stat = os.stat(file_path)
+        meta = {
+            "path": os.path.abspath(file_path),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+        }
+        if (
+            stored_meta
+            and stored_meta.get("size") == meta["size"]
+            and stored_meta.get("mtime_ns") == meta["mtime_ns"]
+        ):
+            meta["content_hash"] = stored_meta["content_hash"]
+        else:
+            meta["content_hash"] = hash_file(file_path)
+        return meta
+
+    def load(self, file_path, parser, variant=""):
+        """
+        Loads a parsed DataFrame from the cache, re-parsing the source when the entry is stale.
+
+        Args:
+            file_path (str): Path of the source file.
+            parser (callable): Parses the source file path into a DataFrame.
+            variant (str): Anything else that changes the parsed result, e.g. the column renames.
+
+        Returns:
+            pd.DataFrame: The parsed DataFrame.
+        """
+        data_path, meta_path = self.get_entry_paths(file_path, variant)
+
+        stored_meta = None
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                stored_meta = json.load(f)
+
+        meta = self.get_source_meta(file_path, stored_meta)
+        if (
+            stored_meta
+            and stored_meta["content_hash"] == meta["content_hash"]
+            and os.path.exists(data_path)
+        ):
+            if stored_meta != meta:
+                self._write_meta(meta_path, meta)
+            logging.info(f"Cache hit for {file_path}.")
+            return pd.read_parquet(data_path)
+
+        logging.info(f"Cache miss for {file_path}, parsing source.")
+        df = parser(file_path)
+        try:
+            tmp_path = f"{data_path}.tmp"
+            df.to_parquet(tmp_path)
+            os.replace(tmp_path, data_path)
+            self._write_meta(meta_path, meta)
+        except (ImportError, ValueError, TypeError, OSError) as e:
+            logging.warning(f"Could not cache {file_path}: {e}")
+        return df
+
+    def _write_meta(self, meta_path, meta):
+        tmp_path = f"{meta_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_path)
@@ -0,0 +1,305 @@
+# This file contains the run instrumentation: per-stage timings, memory and shapes written as a JSON trace.
+import cProfile
+import functools
+import json
+import logging
+import os
+import platform
+import resource
+import sys
+import time
+import uuid
+from datetime import datetime
+
+
+def get_peak_rss():
+    """
+    Returns:
+        int: The resident set size high-water mark of the process in bytes.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+# writing 5 to this file resets the high-water mark, Linux only
+CLEAR_REFS_PATH = "/proc/self/clear_refs"
+_can_reset_peak_rss = sys.platform.startswith("linux") and os.access(CLEAR_REFS_PATH, os.W_OK)
+
+
+def reset_peak_rss():
+    """
+    Resets the high-water mark to the current RSS, where the platform allows it (Linux).
+
+    Returns:
+        bool: True if the mark was reset. Elsewhere nothing is written and False is returned.
+    """
+    global _can_reset_peak_rss
+    if not _can_reset_peak_rss:
+        return False
+    try:
+        with open(CLEAR_REFS_PATH, "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        # e.g. a kernel or sandbox refusing the write, do not try again
+        _can_reset_peak_rss = False
+        return False
+
+
+def get_shapes(obj):
+    """
+    Describes the shape of a stage input or output.
+
+    Args:
+        obj: A DataFrame, Series, array, or a tuple or list of them as returned by e.g. load_data.
+
+    Returns:
+        list: [rows, cols] of every element that has a shape, cols is 1 for one-dimensional data.
+    """
+    items = obj if isinstance(obj, (tuple, list)) else [obj]
+    shapes = []
+    for item in items:
+        shape = getattr(item, "shape", None)
+        if shape is not None and len(shape) > 0:
+            shapes.append([int(shape[0]), int(shape[1]) if len(shape) > 1 else 1])
+    return shapes
+
+
+class Span:
+    """
+    Measures one stage: wall time, CPU time, peak RSS and input and output shapes.
+    """
+
+    def __init__(self, tracer, name, inputs=None):
+        self.tracer = tracer
+        self.name = name
+        self.record = {
+            "stage": name,
+            "parent": tracer.stack[-1].name if tracer.stack else None,
+            "input_shapes": get_shapes(inputs) if inputs is not None else [],
+            "output_shapes": [],
+        }
+        self.peak_rss = 0
+        self.profiler = None
+
+    def set_output(self, outputs):
+        """
+        Records the shapes of the stage output.
+        """
+        self.record["output_shapes"] = get_shapes(outputs)
+
+    def __enter__(self):
+        # the reset below drops the marks of the enclosing stages, keep them first
+        peak = get_peak_rss()
+        for span in self.tracer.stack:
+            span.peak_rss = max(span.peak_rss, peak)
+        self.record["peak_rss_scope"] = "stage" if reset_peak_rss() else "process"
+        self.tracer.stack.append(self)
+
+        if self.name == self.tracer.profile_stage and self.tracer.profile_path:
+            self.profiler = cProfile.Profile()
+            try:
+                self.profiler.enable()
+            except ValueError:
+                # another profiler is already active
+                self.profiler = None
+
+        self.start_time = datetime.now().isoformat(timespec="milliseconds")
+        self.start_wall = time.perf_counter()
+        self.start_cpu = time.process_time()
+        self.start_children = os.times()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        wall_seconds = time.perf_counter() - self.start_wall
+        cpu_seconds = time.process_time() - self.start_cpu
+        children = os.times()
+        # worker processes that have been joined
+        child_cpu_seconds = (children.children_user - self.start_children.children_user
+                             + children.children_system - self.start_children.children_system)
+
+        if self.profiler is not None:
+            self.profiler.disable()
+            self.profiler.dump_stats(self.tracer.profile_path)
+            logging.info(f"Profile of stage {self.name} written to {self.tracer.profile_path}.")
+
+        self.tracer.stack.pop()
+        self.record.update({
+            "started_at": self.start_time,
+            "wall_seconds": wall_seconds,
+            "cpu_seconds": cpu_seconds,
+            "child_cpu_seconds": child_cpu_seconds,
+            "peak_rss_bytes": max(self.peak_rss, get_peak_rss()),
+            "status": "error" if exc_type else "ok",
+        })
+        if exc_type:
+            self.record["error"] = f"{exc_type.__name__}: {exc_value}"
+        self.tracer.records.append(self.record)
+        return False
+
+
+class _NullSpan:
+    """
+    The span of a disabled tracer, measures nothing.
+    """
+
+    def set_output(self, outputs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    """
+    Records the stages of a run and writes them as a JSON trace.
+
+    Used as a context manager, the tracer becomes the active tracer of the process, which
+    the functions decorated with traced() report to. While no tracer is active, traced
+    functions only pay for one attribute check.
+
+    Example:
+        with Tracer(trace_path="trace.json", profile_stage="Model.preprocess_data"):
+            main()
+    """
+
+    def __init__(self, trace_path=None, profile_stage=None, profile_path=None, enabled=True):
+        """
+        Initializes the tracer.
+
+        Args:
+            trace_path (str): File the JSON trace is written to when the tracer exits.
+            profile_stage (str): Name of a stage run under cProfile.
+            profile_path (str): File of the cProfile dump, next to the trace if None.
+            enabled (bool): Record anything at all.
+        """
+        self.enabled = enabled
+        self.trace_path = trace_path
+        self.profile_stage = profile_stage
+        if profile_stage and profile_path is None:
+            profile_path = f"{os.path.splitext(trace_path or 'trace')[0]}-{profile_stage}.prof"
+        self.profile_path = profile_path
+        self.run_id = uuid.uuid4().hex
+        self.started_at = datetime.now().isoformat(timespec="seconds")
+        self.records = []
+        self.stack = []
+        self._previous = None
+
+    def stage(self, name, inputs=None):
+        """
+        Measures a block of code.
+
+        Args:
+            name (str): Name of the stage.
+            inputs: The stage input, its shapes are recorded, see get_shapes().
+
+        Returns:
+            Span: A context manager, call set_output() on it to record the output shapes.
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return Span(self, name, inputs)
+
+    def get_trace(self):
+        """
+        Returns:
+            dict: The run metadata and the records of the finished stages, in order of completion.
+        """
+        return {
+            "run_id": self.run_id,
+            "started_at": self.started_at,
+            "python_version": platform.python_version(),
+            "platform": platform.platform(),
+            "pid": os.getpid(),
+            "stages": self.records,
+        }
+
+    def save(self, trace_path=None):
+        """
+        Writes the trace as JSON.
+
+        Args:
+            trace_path (str): File to write, the tracer's trace_path if None.
+        """
+        trace_path = trace_path or self.trace_path
+        tmp_path = f"{trace_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.get_trace(), f, indent=2)
+        os.replace(tmp_path, trace_path)
+        logging.info(f"Trace of {len(self.records)} stages written to {trace_path}.")
+
+    def __enter__(self):
+        global _active_tracer
+        self._previous, _active_tracer = _active_tracer, self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        global _active_tracer
+        _active_tracer = self._previous
+        if self.enabled and self.trace_path:
+            self.save()
+        return False
+
+
+_active_tracer = Tracer(enabled=False)
+
+
+def get_tracer():
+    """
+    Returns:
+        Tracer: The active tracer, a disabled one outside of any `with Tracer()` block.
+    """
+    return _active_tracer
+
+
+def traced(name=None, get_input=None):
+    """
+    Decorates a function so each call is recorded as a stage of the active tracer.
+
+    Works on plain functions and methods. The Windfall train_test_stratifysplit and
+    xgb_pipeline are decorated with it whenever this module is importable, and run
+    undecorated otherwise.
+
+    Args:
+        name (str): Name of the stage, the function's qualified name if None.
+        get_input (callable): Returns the input whose shapes are recorded from the call
+            arguments. The first positional argument with a shape is used if None.
+
+    Returns:
+        callable: The decorator.
+    """
+    def decorator(func):
+        stage_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            tracer = _active_tracer
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+
+            if get_input is not None:
+                inputs = get_input(*args, **kwargs)
+            else:
+                inputs = next((arg for arg in args if getattr(arg, "shape", None) is not None), None)
+            with tracer.stage(stage_name, inputs) as span:
+                outputs = func(*args, **kwargs)
+                span.set_output(outputs)
+            return outputs
+
+        return wrapper
+
+    return decorator
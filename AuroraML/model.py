@@ -1,29 +1,265 @@
+import hashlib
+import importlib.util
+import json
+import os
+import time
+from datetime import datetime
+
+import joblib
 import pandas as pd
 import numpy as np
+import sklearn
+from scipy import sparse as sp
 
 from sklearn.impute import SimpleImputer
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler, OneHotEncoder, FunctionTransformer
 from sklearn.pipeline import Pipeline
 from sklearn.compose import ColumnTransformer
-from sklearn.ensemble import GradientBoostingClassifier
+from sklearn.ensemble import GradientBoostingClassifier, HistGradientBoostingClassifier
+from sklearn.metrics import roc_auc_score
+
+from instrumentation import get_tracer, traced
+
+# bumped when the layout of saved artifacts changes
+ARTIFACT_FORMAT_VERSION = 1
+
+# Windfall tuning module holding the fixed xgboost parameters
+WINDFALL_XGB_MODULE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "..", "Windfall_aleport", "notebooks", "models", "train_predict_model_xgb_tpe.py",
+)
+
+
+def load_windfall_xgb_module():
+    """
+    Loads the Windfall xgboost tuning module from its file, without putting its package on the path.
+
+    Returns:
+        module: The train_predict_model_xgb_tpe module.
+    """
+    spec = importlib.util.spec_from_file_location("train_predict_model_xgb_tpe", WINDFALL_XGB_MODULE)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def log10_plus_one(x):
+    """
+    Log-transforms non-negative values, defined at module level so pipelines using it can be pickled.
+
+    Args:
+        x (np.ndarray): Values to transform.
+
+    Returns:
+        np.ndarray: log10(x + 1).
+    """
+    return np.log10(x + 1)
 
 class Model:
     """
     Initializes the Model class.
     """
+    SCHEMA_BLOCK_SIZE = 512
+    ESTIMATOR_BACKENDS = ("gbc", "hist", "xgb")
+
     def __init__(self, 
                  df: pd.DataFrame, 
                  label_column: str = "target",
                  id_column: str = 'candidate_id',
-                 log_transform_features: list = ['NetWorth', 'primaryPropertyValue']
+                 log_transform_features: list = ['NetWorth', 'primaryPropertyValue'],
+                 schema_path: str = None,
+                 schema_sample_rows: int = None,
+                 estimator="gbc",
+                 n_jobs: int = None,
+                 artifact_path: str = None,
+                 sparse: bool = False,
+                 min_category_frequency=None,
+                 max_categories: int = None
                  ):
 
         self.df = df
         self.label_column = label_column
         self.id_column = id_column
         self.log_transform_features = log_transform_features
+        self.schema_path = schema_path
+        self.schema_sample_rows = schema_sample_rows
+        self.schema = None
+        self.estimator = estimator
+        self.n_jobs = n_jobs
+        self.artifact_path = artifact_path
+        self.sparse = sparse
+        self.min_category_frequency = min_category_frequency
+        self.max_categories = max_categories
+        self.memory_footprint = None
+        self.X_train = None
+
+    def get_estimator(self, backend):
+        """
+        Creates the classifier of an estimator backend.
+
+        Args:
+            backend (str or estimator): "gbc" for the single-threaded GradientBoostingClassifier,
+                "hist" for the multi-core HistGradientBoostingClassifier, "xgb" for an
+                XGBClassifier with the Windfall get_fixed_params defaults, or any
+                scikit-learn classifier, used as is.
+
+        Returns:
+            estimator: An unfitted classifier.
+        """
+        if not isinstance(backend, str):
+            return backend
+
+        if backend == "gbc":
+            return GradientBoostingClassifier(random_state=42)
+
+        if backend == "hist":
+            if self.sparse:
+                raise ValueError("The 'hist' backend does not accept sparse input, use 'gbc' or 'xgb' with sparse=True.")
+            # runs on all cores through OpenMP
+            return HistGradientBoostingClassifier(random_state=42)
+
+        if backend == "xgb":
+            import xgboost
+            from xgboost import XGBClassifier
+
+            windfall = load_windfall_xgb_module()
+            params = windfall.get_fixed_params()
+            xgb_params = dict(
+                booster=params["booster"],
+                objective=params["objective"],
+                learning_rate=params["eta"],
+                random_state=params["seed"],
+                verbosity=params["verbosity"],
+                reg_alpha=params["alpha"],
+                n_estimators=windfall.XGB_bst_rounds,
+                # passed on to the booster through **kwargs by older versions
+                tree_method="hist",
+                n_jobs=self.n_jobs,
+            )
+            if tuple(int(part) for part in xgboost.__version__.split(".")[:2]) >= (1, 6):
+                xgb_params["eval_metric"] = params["eval_metric"]
+            else:
+                # the pinned 0.90 takes eval_metric in fit() only, where it just scores an
+                # eval_set, and wants a thread count, -1 for all cores like None later on
+                xgb_params["n_jobs"] = -1 if self.n_jobs is None else self.n_jobs
+            return XGBClassifier(**xgb_params)
+
+        raise ValueError(f"Unknown estimator backend {backend!r}, expected one of {self.ESTIMATOR_BACKENDS}.")
+
+    def infer_schema(self, X, sample_rows=None, random_state=42):
+        """
+        Classifies the feature columns as numerical, binary, categorical or log-transformed in one pass.
+
+        Binary columns are numeric columns whose non-missing values are all 0 or 1. They are
+        detected on blocks of columns at once instead of column by column.
+
+        Args:
+            X (pd.DataFrame): The feature matrix.
+            sample_rows (int): Inspect only this many randomly sampled rows. A column that takes
+                values other than 0 and 1 only outside the sample is then classified as binary.
+            random_state (int): Seed of the row sample.
+
+        Returns:
+            dict: Column lists under "numerical", "binary", "categorical" and "log".
+        """
+        if sample_rows is not None and sample_rows < len(X):
+            X = X.sample(n=sample_rows, random_state=random_state)
+
+        all_numerical = X.select_dtypes(include=[np.number]).columns.tolist()
+        categorical_features = X.select_dtypes(include=['object', 'category']).columns.tolist()
+
+        # Automatically detect binary features (0, 1, NaN)
+        binary_features = []
+        for start in range(0, len(all_numerical), self.SCHEMA_BLOCK_SIZE):
+            block = all_numerical[start:start + self.SCHEMA_BLOCK_SIZE]
+            values = X[block].to_numpy(dtype=np.float64, na_value=np.nan)
+            is_binary = ((values == 0) | (values == 1) | np.isnan(values)).all(axis=0)
+            binary_features.extend(col for col, binary in zip(block, is_binary) if binary)
+
+        # Identify log-transformed features
+        excluded = set(binary_features) | set(self.log_transform_features)
+        numerical_features = [col for col in all_numerical if col not in excluded]
+
+        return {
+            "numerical": numerical_features,
+            "binary": binary_features,
+            "categorical": categorical_features,
+            "log": list(self.log_transform_features),
+        }
+
+    def get_column_fingerprint(self, X):
+        """
+        Hashes what infer_schema() depends on: the column names and dtypes, in order,
+        and the log-transformed features.
+
+        Args:
+            X (pd.DataFrame): The feature matrix.
+
+        Returns:
+            str: The hex digest.
+        """
+        description = {
+            "columns": [[col, str(dtype)] for col, dtype in X.dtypes.items()],
+            "log": list(self.log_transform_features),
+        }
+        return hashlib.blake2b(json.dumps(description).encode(), digest_size=16).hexdigest()
+
+    def save_schema(self, schema, schema_path):
+        """
+        Saves an inferred schema so training and scoring can reuse it.
+
+        Args:
+            schema (dict): Output of infer_schema().
+            schema_path (str): JSON file to write.
+        """
+        tmp_path = f"{schema_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(schema, f, indent=2)
+        os.replace(tmp_path, schema_path)
+        print(f"Schema saved to {schema_path}.")
+
+    def load_schema(self, schema_path):
+        """
+        Loads a schema saved by save_schema().
+
+        Args:
+            schema_path (str): JSON file to read.
+
+        Returns:
+            dict: Column lists under "numerical", "binary", "categorical" and "log", and the
+                "fingerprint" of the columns it was inferred from.
+        """
+        with open(schema_path) as f:
+            return json.load(f)
+
+    def get_schema(self, X):
+        """
+        Returns the schema saved at schema_path when it was inferred from the same columns,
+        otherwise infers it and saves it there.
+
+        Args:
+            X (pd.DataFrame): The feature matrix.
+
+        Returns:
+            dict: Column lists under "numerical", "binary", "categorical" and "log", and the
+                "fingerprint" of the columns of X.
+        """
+        fingerprint = self.get_column_fingerprint(X)
+        if self.schema_path and os.path.exists(self.schema_path):
+            schema = self.load_schema(self.schema_path)
+            if schema.get("fingerprint") == fingerprint:
+                print(f"Schema loaded from {self.schema_path}.")
+                return schema
+            print(f"Schema at {self.schema_path} was inferred from other columns, inferring it again.")
+
+        schema = self.infer_schema(X, sample_rows=self.schema_sample_rows)
+        schema["fingerprint"] = fingerprint
+        if self.schema_path:
+            self.save_schema(schema, self.schema_path)
+        return schema
         
+    @traced("Model.preprocess_data", get_input=lambda self: self.df)
     def preprocess_data(self):
         """
         Performs data preprocessing steps, including splitting and scaling.
@@ -47,18 +283,121 @@ class Model:
         # if self.id_column in self.label_column:
         #     y = self.df[self.label_column].drop(columns=[self.id_column])
         
-        all_numerical = X.select_dtypes(include=[np.number]).columns.tolist()
-        categorical_features = X.select_dtypes(include=['object', 'category']).columns.tolist()
-        binary_features = []
+        self.schema = self.get_schema(X)
         
-        # Automatically detect binary features (0, 1, NaN)
-        for col in all_numerical:
-            unique_values = X[col].dropna().unique()
-            if set(unique_values).issubset({0,1}):
-                binary_features.append(col)
+        # Create the final pipeline
+        pipeline = Pipeline(steps=[
+            ('preprocessor', self.build_preprocessor(self.schema, self.estimator)),
+            ('GBC', self.get_estimator(self.estimator))
+        ])
         
-        # Identify log-transformed features
-        numerical_features = [col for col in all_numerical if col not in binary_features + self.log_transform_features]
+        # Fit the pipeline on the training data only and then transform both sets
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, shuffle=True, random_state=42, stratify=y)
+        print(f"Data split into training ({X_train.shape}) and testing ({X_test.shape}) sets.")
+        self.X_train = X_train
+        
+        # fit the steps one by one, as pipeline.fit does, to measure the matrix it produces
+        with get_tracer().stage("Model.fit", X_train):
+            Xt = pipeline.named_steps['preprocessor'].fit_transform(X_train, y_train)
+            pipeline.named_steps['GBC'].fit(Xt, y_train)
+        
+        self.memory_footprint = self.get_memory_footprint(Xt)
+        del Xt
+        print(f"Transformed training matrix: {self.memory_footprint['shape']}, "
+              f"{self.memory_footprint['nbytes'] / 1e6:.1f} MB "
+              f"({self.memory_footprint['dense_nbytes'] / 1e6:.1f} MB if dense).")
+        
+        if self.artifact_path:
+            self.save_artifact(pipeline, self.artifact_path)
+            
+        return pipeline, X_test, y_test
+
+    def save_artifact(self, pipeline, artifact_path):
+        """
+        Saves a fitted pipeline as a versioned artifact for scoring.
+
+        The pipeline is stored uncompressed so its arrays can be memory-mapped on load,
+        and its saved preprocessor transforms in the calling process. The n_jobs of the
+        given pipeline is left as it was.
+        The metadata is also written next to it as JSON.
+
+        Args:
+            pipeline (Pipeline): The fitted pipeline.
+            artifact_path (str): File to write, e.g. models/model.joblib.
+        """
+        metadata = {
+            "format_version": ARTIFACT_FORMAT_VERSION,
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "sklearn_version": sklearn.__version__,
+            "numpy_version": np.__version__,
+            "label_column": self.label_column,
+            "id_column": self.id_column,
+            "schema": self.schema,
+        }
+        
+        # scoring transforms small batches, where a process pool per call costs more than it saves,
+        # the caller's pipeline gets its n_jobs back once the artifact is written
+        preprocessor = pipeline.named_steps.get("preprocessor")
+        if preprocessor is not None:
+            n_jobs = preprocessor.n_jobs
+            preprocessor.set_params(n_jobs=None)
+        
+        tmp_path = f"{artifact_path}.tmp"
+        try:
+            joblib.dump({"metadata": metadata, "pipeline": pipeline}, tmp_path, compress=0)
+        finally:
+            if preprocessor is not None:
+                preprocessor.set_params(n_jobs=n_jobs)
+        os.replace(tmp_path, artifact_path)
+        with open(f"{artifact_path}.json", "w") as f:
+            json.dump(metadata, f, indent=2)
+        print(f"Model artifact saved to {artifact_path}.")
+
+    @staticmethod
+    def load_artifact(artifact_path):
+        """
+        Loads an artifact saved by save_artifact().
+
+        Args:
+            artifact_path (str): The artifact file.
+
+        Returns:
+            tuple: The fitted pipeline and its metadata.
+        """
+        artifact = joblib.load(artifact_path, mmap_mode="r")
+        metadata = artifact["metadata"]
+        
+        if metadata["format_version"] != ARTIFACT_FORMAT_VERSION:
+            raise ValueError(
+                f"Artifact {artifact_path} has format version {metadata['format_version']}, "
+                f"expected {ARTIFACT_FORMAT_VERSION}."
+            )
+        if metadata["sklearn_version"] != sklearn.__version__:
+            print(f"Warning: {artifact_path} was saved with scikit-learn {metadata['sklearn_version']}, "
+                  f"running {sklearn.__version__}.")
+        
+        return artifact["pipeline"], metadata
+
+    def build_preprocessor(self, schema, backend="gbc"):
+        """
+        Builds the column transformer of a schema.
+
+        In sparse mode the output is a sparse matrix whenever there are categorical columns,
+        without them it stays dense. Rare categories are grouped into one infrequent level
+        per column, see min_category_frequency and max_categories.
+
+        Args:
+            schema (dict): Output of infer_schema().
+            backend (str or estimator): The estimator backend the output is fed to. The
+                "hist" backend does not accept sparse input, so its output is always dense.
+
+        Returns:
+            ColumnTransformer: The unfitted preprocessor.
+        """
+        numerical_features = schema["numerical"]
+        categorical_features = schema["categorical"]
+        binary_features = schema["binary"]
+        log_transform_features = schema["log"]
         
                     
         # Create seperate transformers for each data type
@@ -67,9 +406,17 @@ class Model:
             ('scaler', StandardScaler()),
         ])
         
+        if self.sparse:
+            onehot = OneHotEncoder(handle_unknown='infrequent_if_exist',
+                                   min_frequency=self.min_category_frequency,
+                                   max_categories=self.max_categories,
+                                   sparse_output=True)
+        else:
+            onehot = OneHotEncoder(handle_unknown='ignore')
+        
         categorical_transformer = Pipeline(steps=[
             ('imputer', SimpleImputer(strategy='constant', fill_value='-9999')),
-            ('onehot', OneHotEncoder(handle_unknown='ignore'))
+            ('onehot', onehot)
         ])
         
         binary_transformer = Pipeline(steps=[
@@ -78,7 +425,7 @@ class Model:
         
         log_transformer = Pipeline(steps=[
             ('imputer', SimpleImputer(strategy='constant', fill_value=0)),
-            ('log', FunctionTransformer(lambda x: np.log10(x+1))),
+            ('log', FunctionTransformer(log10_plus_one)),
             ('scaler', StandardScaler())
         ])
         
@@ -88,33 +435,87 @@ class Model:
             ('cat', categorical_transformer, categorical_features),
         ]
         
-        if self.log_transform_features:
-            preprocessor_transformers.append(('log', log_transformer, self.log_transform_features))
+        if log_transform_features:
+            preprocessor_transformers.append(('log', log_transformer, log_transform_features))
         
         if binary_features:
             preprocessor_transformers.append(('binary', binary_transformer, binary_features))
             
-        preprocessor = ColumnTransformer(
+        return ColumnTransformer(
             transformers=preprocessor_transformers,
-            remainder='passthrough'
+            remainder='passthrough',
+            sparse_threshold=1.0 if self.sparse else 0 if backend == "hist" else 0.3,
+            n_jobs=self.n_jobs
         )
+
+    @staticmethod
+    def get_memory_footprint(Xt):
+        """
+        Measures the memory held by a transformed feature matrix.
+
+        Args:
+            Xt (np.ndarray or scipy.sparse matrix): Output of the preprocessor.
+
+        Returns:
+            dict: The shape, bytes held, bytes a dense float64 copy would need, and for
+                sparse matrices the number of stored values and the density.
+        """
+        n_cells = Xt.shape[0] * Xt.shape[1]
+        footprint = {"shape": Xt.shape, "dense_nbytes": n_cells * np.dtype(np.float64).itemsize}
         
-        # Create the final pipeline
-        pipeline = Pipeline(steps=[
-            ('preprocessor', preprocessor),
-            ('GBC', GradientBoostingClassifier(random_state=42))
-        ])
+        if sp.issparse(Xt):
+            Xt = Xt.tocsr()
+            footprint["nbytes"] = Xt.data.nbytes + Xt.indices.nbytes + Xt.indptr.nbytes
+            footprint["nnz"] = Xt.nnz
+            footprint["density"] = Xt.nnz / n_cells if n_cells else 0.0
+        else:
+            footprint["nbytes"] = Xt.nbytes
         
-        # Fit the pipeline on the training data only and then transform both sets
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, shuffle=True, random_state=42, stratify=y)
-        print(f"Data split into training ({X_train.shape}) and testing ({X_test.shape}) sets.")
-        
-        pipeline.fit(X_train, y_train)
+        return footprint
+
+    def benchmark_backends(self, backends=ESTIMATOR_BACKENDS):
+        """
+        Fits every estimator backend on the same train/test split and compares them.
+
+        Args:
+            backends (list): Estimator backends, see get_estimator().
+
+        Returns:
+            pd.DataFrame: Fit seconds, predict seconds and test AUC of each backend.
+        """
+        features_to_drop = [self.label_column] + [self.id_column]
+        X = self.df.drop(columns=features_to_drop, errors='ignore')
+        y = self.df[self.label_column]
+        schema = self.get_schema(X)
         
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, shuffle=True, random_state=42, stratify=y)
+        print(f"Benchmarking on training ({X_train.shape}) and testing ({X_test.shape}) sets.")
         
-        #joblib.dump(scaler, f'scaler_{self.project_name}_{self.current_date}.joblib')
+        results = []
+        for backend in backends:
+            pipeline = Pipeline(steps=[
+                ('preprocessor', self.build_preprocessor(schema, backend)),
+                ('GBC', self.get_estimator(backend))
+            ])
             
-        return pipeline, X_test, y_test
+            start = time.perf_counter()
+            pipeline.fit(X_train, y_train)
+            fit_seconds = time.perf_counter() - start
+            
+            start = time.perf_counter()
+            y_score = pipeline.predict_proba(X_test)[:, 1]
+            predict_seconds = time.perf_counter() - start
+            
+            auc = roc_auc_score(y_test, y_score)
+            print(f"{backend}: fit {fit_seconds:.2f}s, predict {predict_seconds:.2f}s, AUC {auc:.4f}")
+            results.append({
+                "backend": backend if isinstance(backend, str) else type(backend).__name__,
+                "fit_seconds": fit_seconds,
+                "predict_seconds": predict_seconds,
+                "auc": auc,
+            })
+        
+        return pd.DataFrame(results).set_index("backend")
     
 if __name__ == '__main__':
     # Create a dummy DataFrame with an ID column and all feature types
@@ -4,11 +4,241 @@ import numpy as np
 from datetime import date
 from dateutil.relativedelta import relativedelta
 from functools import reduce
+import importlib.util
 import logging
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from data_cache import DataCache
+from instrumentation import traced
 
 # import joblib
 
 
+# Windfall feature engineering module holding optimize_dtypes
+WINDFALL_FEATURE_MODULE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "..", "Windfall_aleport", "notebooks", "preprocess", "featureengineering.py",
+)
+
+
+def load_windfall_feature_module():
+    """
+    Loads the Windfall feature engineering module from its file, without putting its package on the path.
+
+    Returns:
+        module: The featureengineering module.
+    """
+    spec = importlib.util.spec_from_file_location("featureengineering", WINDFALL_FEATURE_MODULE)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# one implementation shared with the Windfall notebooks, returns (df, report)
+optimize_dtypes = load_windfall_feature_module().optimize_dtypes
+
+
+class DonationBucketState:
+    """
+    Running per-candidate donation totals by time bucket.
+
+    Holds one row per candidate and one column per time bucket, plus the daily totals
+    of the donations that are not yet in the oldest bucket, including the pending ones
+    made after the prediction date. Those are the only donations that change bucket when
+    the prediction date moves forward, see rebucket(). Memory is therefore set by the
+    number of candidates and their recent donation days, and not by the number of
+    donations seen.
+    """
+
+    def __init__(self, candidate_ids, bucket_labels, pred_date=None):
+        """
+        Initializes an empty state.
+
+        Args:
+            candidate_ids (array-like): Unique ids of the candidates to track.
+            bucket_labels (list): Time bucket labels ordered from oldest to most recent.
+            pred_date (str): The prediction date the buckets are relative to.
+        """
+        self.candidate_index = pd.Index(candidate_ids, name="candidate_id")
+        self.bucket_labels = list(bucket_labels)
+        self.pred_date = pred_date
+        shape = (len(self.candidate_index), len(self.bucket_labels))
+        self.sums = np.zeros(shape, dtype=np.float64)
+        self.counts = np.zeros(shape, dtype=np.int64)
+        # daily totals of the donations in the recent buckets or after pred_date,
+        # one entry per candidate and day
+        self.recent_rows = np.zeros(0, dtype=np.int64)
+        self.recent_days = np.zeros(0, dtype=np.int64)
+        self.recent_sums = np.zeros(0, dtype=np.float64)
+        self.recent_counts = np.zeros(0, dtype=np.int64)
+
+    def update(self, candidate_ids, bucket_codes, amounts, trans_days=None):
+        """
+        Adds a batch of bucketed donations to the running totals.
+
+        Donations of candidates that are not tracked are ignored.
+
+        Args:
+            candidate_ids (array-like): Candidate id of each donation.
+            bucket_codes (np.ndarray): Time bucket position of each donation, -1 for a
+                donation after the prediction date.
+            amounts (np.ndarray): Amount of each donation, NaN counts as 0.
+            trans_days (np.ndarray): Day of each donation as days since 1970-01-01. If set,
+                donations outside the oldest bucket are kept in the daily totals so they
+                can be rebucketed, and donations after the prediction date are kept as
+                pending. If None, donations after the prediction date are ignored.
+
+        Returns:
+            np.ndarray: Sorted positions of the candidates whose totals changed.
+        """
+        rows = self.candidate_index.get_indexer(candidate_ids)
+        keep = rows >= 0
+        rows, cols = rows[keep], np.asarray(bucket_codes)[keep]
+        amounts = np.nan_to_num(np.asarray(amounts, dtype=np.float64)[keep])
+        counted = cols >= 0
+        np.add.at(self.sums, (rows[counted], cols[counted]), amounts[counted])
+        np.add.at(self.counts, (rows[counted], cols[counted]), 1)
+
+        if trans_days is not None:
+            recent = cols != 0
+            self._add_recent(
+                rows[recent],
+                np.asarray(trans_days, dtype=np.int64)[keep][recent],
+                amounts[recent],
+                np.ones(recent.sum(), dtype=np.int64),
+            )
+        return np.unique(rows[counted])
+
+    def rebucket(self, old_codes, new_codes, pred_date):
+        """
+        Moves the daily totals to their buckets relative to a later prediction date.
+
+        Args:
+            old_codes (np.ndarray): Bucket position of each daily total relative to pred_date,
+                -1 for a pending one.
+            new_codes (np.ndarray): Bucket position of each daily total relative to the new date,
+                -1 for one still pending.
+            pred_date (str): The new prediction date.
+
+        Returns:
+            np.ndarray: Sorted positions of the candidates whose totals changed.
+        """
+        moved = old_codes != new_codes
+        rows = self.recent_rows[moved]
+        for codes, sign in ((old_codes, -1), (new_codes, 1)):
+            # pending donations are in no bucket
+            counted = moved & (codes >= 0)
+            np.add.at(self.sums, (self.recent_rows[counted], codes[counted]), sign * self.recent_sums[counted])
+            np.add.at(self.counts, (self.recent_rows[counted], codes[counted]), sign * self.recent_counts[counted])
+
+        # the oldest bucket is open ended, its donations never move again
+        recent = new_codes != 0
+        self.recent_rows = self.recent_rows[recent]
+        self.recent_days = self.recent_days[recent]
+        self.recent_sums = self.recent_sums[recent]
+        self.recent_counts = self.recent_counts[recent]
+        self.pred_date = pred_date
+        return np.unique(rows)
+
+    def _add_recent(self, rows, days, sums, counts):
+        rows = np.concatenate([self.recent_rows, rows])
+        days = np.concatenate([self.recent_days, days])
+        entries, inverse = np.unique(np.stack([rows, days], axis=1), axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        self.recent_rows, self.recent_days = entries[:, 0], entries[:, 1]
+        self.recent_sums = np.bincount(
+            inverse, weights=np.concatenate([self.recent_sums, sums]), minlength=len(entries)
+        )
+        self.recent_counts = np.bincount(
+            inverse, weights=np.concatenate([self.recent_counts, counts]), minlength=len(entries)
+        ).astype(np.int64)
+
+    def get_cumulative(self, rows=slice(None)):
+        """
+        Accumulates the totals from the most recent bucket backwards.
+
+        Args:
+            rows (array-like): Positions of the candidates to accumulate, all by default.
+
+        Returns:
+            tuple: cum_sum and cum_count arrays with one column per bucket.
+        """
+        cum_sum = np.cumsum(self.sums[rows, ::-1], axis=1)[:, ::-1]
+        cum_count = np.cumsum(self.counts[rows, ::-1], axis=1)[:, ::-1]
+        return cum_sum, cum_count
+
+    def to_bucket_agg(self):
+        """
+        Builds backward cumulative sum and count features from the totals.
+
+        Returns:
+            pd.DataFrame: cum_sum and cum_count indexed by candidate_id and time_bucket,
+                with a row for each bucket a candidate donated in.
+        """
+        cum_sum, cum_count = self.get_cumulative()
+
+        rows, cols = np.nonzero(self.counts)
+        index = pd.MultiIndex.from_arrays(
+            [
+                self.candidate_index[rows],
+                pd.Categorical.from_codes(cols, categories=self.bucket_labels, ordered=True),
+            ],
+            names=["candidate_id", "time_bucket"],
+        )
+        return pd.DataFrame(
+            {"cum_sum": cum_sum[rows, cols], "cum_count": cum_count[rows, cols]},
+            index=index,
+        )
+
+    def save(self, path):
+        """
+        Saves the state to a .npz file.
+
+        Args:
+            path (str): Destination file path.
+        """
+        np.savez(
+            path,
+            candidate_ids=np.asarray(self.candidate_index.tolist()),
+            bucket_labels=np.asarray(self.bucket_labels),
+            pred_date=np.asarray(self.pred_date or ""),
+            sums=self.sums,
+            counts=self.counts,
+            recent_rows=self.recent_rows,
+            recent_days=self.recent_days,
+            recent_sums=self.recent_sums,
+            recent_counts=self.recent_counts,
+        )
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads a state saved with save().
+
+        Args:
+            path (str): Path of the .npz file.
+
+        Returns:
+            DonationBucketState: The loaded state.
+        """
+        with np.load(path, allow_pickle=False) as data:
+            state = cls(
+                data["candidate_ids"],
+                data["bucket_labels"].tolist(),
+                pred_date=str(data["pred_date"]) or None,
+            )
+            state.sums = data["sums"]
+            state.counts = data["counts"]
+            state.recent_rows = data["recent_rows"]
+            state.recent_days = data["recent_days"]
+            state.recent_sums = data["recent_sums"]
+            state.recent_counts = data["recent_counts"]
+        return state
+
+
 class DataPreprocessing:
     """
     A class to handle data loading, feature engineering, and preprocessing.
@@ -17,21 +247,86 @@ class DataPreprocessing:
     # CURRENT_DATE = pd.Timestamp.now()
     CURRENT_DATE = date.today()
 
-    def __init__(self, file_paths=[None], project_name="client_x_ptg"):
+    MIN_YEAR = 1950
+    DEFAULT_CHUNKSIZE = 1_000_000
+    TIME_BUCKET_BINS = [-np.inf, -5 * 365, -4 * 365, -3 * 365, -2 * 365, -1 * 365, 0]
+    TIME_BUCKET_LABELS = [
+        "donation_historical",
+        "donation_p5yr",
+        "donation_p4yr",
+        "donation_p3yr",
+        "donation_p2yr",
+        "donation_p1yr",
+    ]
+    # settings of optimize_dtypes, part of the parquet cache variant
+    DTYPE_OPTIONS = {"max_category_ratio": 0.5, "exact_floats": True}
+    COLUMN_RENAMES = {
+        "label": {"cand_id": "candidate_id", "ideal_donor": "target"},
+        "donation": {"cand_id": "candidate_id"},
+        "feature": {"cand_id": "candidate_id"},
+    }
+
+    def __init__(self, file_paths=[None], project_name="client_x_ptg", cache_dir=None, n_jobs=1, csv_engine=None,
+                 compact_dtypes=True):
         """
         Initializes the DataPreprocessing class with a list of file paths
 
         Args:
             file_paths (list): A list of file paths to the datasets.
+            cache_dir (str): If set, parsed datasets are cached there in parquet format
+                and reused until their source file changes. They are cached after
+                optimize_dtypes when compact_dtypes is set.
+            n_jobs (int): Number of files parsed concurrently by load_data.
+            csv_engine (str): Parser engine passed to pd.read_csv, e.g. "pyarrow" for its
+                multi-threaded reader. None uses the pandas default.
+            compact_dtypes (bool): Downcast the loaded datasets and the engineered features
+                with optimize_dtypes and DTYPE_OPTIONS.
         """
         if file_paths:
             self.file_paths = file_paths
             self.project_name = project_name
+            self.data_cache = DataCache(cache_dir) if cache_dir else None
+            self.n_jobs = n_jobs
+            self.csv_engine = csv_engine
+            self.load_timings = {}
+            self.compact_dtypes = compact_dtypes
+            self.dtype_report = None
     
-    def load_data(self):
+    def get_file_key(self, file_path):
+        """
+        Routes a file path to its dataset by filename.
+
+        Args:
+            file_path (str): Path of a dataset file.
+
+        Returns:
+            str: "label", "donation" or "feature", or None if the path matches none of them.
+        """
+        return next((k for k in self.COLUMN_RENAMES if k in file_path), None)
+
+    def get_file_path(self, key):
+        """
+        Finds the file path routed to a dataset.
+
+        Args:
+            key (str): One of "label", "donation" or "feature".
+
+        Returns:
+            str: The first file path routed to the dataset, or None.
+        """
+        return next((file_path for file_path in self.file_paths if self.get_file_key(file_path) == key), None)
+
+    @traced("DataPreprocessing.load_data")
+    def load_data(self, keys=("label", "donation", "feature")):
         """
         Loads the dataset from specified file paths.
 
+        Files are parsed concurrently when n_jobs > 1. The parse time of each file
+        is kept in self.load_timings.
+
+        Args:
+            keys (tuple): Datasets to load, the others are returned as None.
+
         Returns:
             tuple: A tuple containing the label, donation and feature DataFrames.
         """
@@ -39,30 +334,63 @@ class DataPreprocessing:
         label_df, donation_df, feature_df = None, None, None
 
         try:
-            data_map = {"label": (lambda df: df.rename(columns={"cand_id": "candidate_id", "ideal_donor": "target"}), "label_df"),
-                        "donation": (lambda df: df.rename(columns={"cand_id": "candidate_id"}), "donation_df"),
-                        "feature": (lambda df: df.rename(columns={"cand_id": "candidate_id"}), "feature_df")
+            data_map = {"label": (lambda df: df.rename(columns=self.COLUMN_RENAMES["label"]), "label_df"),
+                        "donation": (lambda df: df.rename(columns=self.COLUMN_RENAMES["donation"]), "donation_df"),
+                        "feature": (lambda df: df.rename(columns=self.COLUMN_RENAMES["feature"]), "feature_df")
             }
             
-            for file_path in self.file_paths:
-                key = next((k for k in data_map if k in file_path), None)
-                
-                if key:
-                    processor, df_name =  data_map[key]
-                    
-                    # load the data
-                    df_temp = pd.read_csv(file_path)
-                    df_temp = processor(df_temp)
-                    
-                    if key == "label":
-                        label_df = df_temp
-                    elif key == "donation":   
-                        donation_df = df_temp
-                    elif key == "feature":
-                        feature_df = df_temp
-                    logging.info(f"Data frame {df_name} successfully loaded from {file_path}.")
-                    
-            logging.info("Data frames successfully loaded.")
+            def read_file(file_path, key):
+                processor, _ = data_map[key]
+                start = time.perf_counter()
+
+                def parse(path):
+                    df_parsed = processor(pd.read_csv(path, engine=self.csv_engine))
+                    if self.compact_dtypes:
+                        df_parsed, _ = optimize_dtypes(df_parsed, **self.DTYPE_OPTIONS)
+                    return df_parsed
+
+                # load the data
+                if self.data_cache:
+                    df_temp = self.data_cache.load(
+                        file_path,
+                        parse,
+                        variant=json.dumps(
+                            {
+                                "renames": self.COLUMN_RENAMES[key],
+                                "engine": self.csv_engine,
+                                "dtypes": self.DTYPE_OPTIONS if self.compact_dtypes else None,
+                            },
+                            sort_keys=True,
+                        ),
+                    )
+                else:
+                    df_temp = parse(file_path)
+
+                return df_temp, time.perf_counter() - start
+
+            file_keys = [(file_path, self.get_file_key(file_path)) for file_path in self.file_paths]
+            file_keys = [(file_path, key) for file_path, key in file_keys if key in keys]
+
+            start = time.perf_counter()
+            if self.n_jobs > 1 and len(file_keys) > 1:
+                with ThreadPoolExecutor(max_workers=self.n_jobs) as executor:
+                    results = list(executor.map(lambda file_key: read_file(*file_key), file_keys))
+            else:
+                results = [read_file(file_path, key) for file_path, key in file_keys]
+
+            self.load_timings = {}
+            for (file_path, key), (df_temp, seconds) in zip(file_keys, results):
+                _, df_name = data_map[key]
+                if key == "label":
+                    label_df = df_temp
+                elif key == "donation":   
+                    donation_df = df_temp
+                elif key == "feature":
+                    feature_df = df_temp
+                self.load_timings[file_path] = seconds
+                logging.info(f"Data frame {df_name} successfully loaded from {file_path} in {seconds:.2f}s.")
+
+            logging.info(f"Data frames successfully loaded in {time.perf_counter() - start:.2f}s.")
             return label_df, donation_df, feature_df
 
         except Exception as e:
@@ -107,13 +435,98 @@ class DataPreprocessing:
     #         logging.error(f"Error loading data: {e}")
     #         return None, None, None
 
-    def engineer_features(self):
+    def get_pred_date(self):
+        """
+        Returns the prediction date donations are bucketed against.
+
+        Returns:
+            str: The prediction date in "%Y-%m-%d" format.
+        """
+        pred_date = DataPreprocessing.CURRENT_DATE - relativedelta(years=5)
+        pred_date = pred_date.strftime("%Y-%m-%d")
+
+        pred_date = "2016-01-01"
+
+        return pred_date
+
+    def get_time_bucket_codes(self, days_from_prediction):
+        """
+        Returns:
+            np.ndarray: The TIME_BUCKET_LABELS position of each day offset, -1 after the prediction date.
+        """
+        return pd.cut(
+            np.asarray(days_from_prediction),
+            bins=self.TIME_BUCKET_BINS,
+            labels=self.TIME_BUCKET_LABELS,
+            ordered=True,
+        ).codes
+
+    def update_bucket_state(self, state, donation_df, pred_date):
+        """
+        Buckets a batch of donations and adds them to a running state.
+
+        Donations after the prediction date are kept in the state as pending, and join
+        their buckets when advance_bucket_state moves the state past them.
+
+        Args:
+            state (DonationBucketState): The running per-candidate totals.
+            donation_df (pd.DataFrame): Donations with candidate_id, trans_date and amount.
+            pred_date (str): The prediction date donations are bucketed against.
+
+        Returns:
+            np.ndarray: Sorted state positions of the candidates whose totals changed.
+        """
+        pred_date = pd.to_datetime(pred_date)
+        trans_date = pd.to_datetime(donation_df["trans_date"])
+        valid = (trans_date.dt.year >= self.MIN_YEAR).to_numpy()
+
+        days_from_prediction = (trans_date[valid] - pred_date).dt.days
+        return state.update(
+            donation_df["candidate_id"].to_numpy()[valid],
+            self.get_time_bucket_codes(days_from_prediction),
+            donation_df["amount"].to_numpy()[valid],
+            trans_days=(trans_date[valid] - pd.Timestamp(0)).dt.days.to_numpy(),
+        )
+
+    def advance_bucket_state(self, state, pred_date):
+        """
+        Moves a running state to a later prediction date.
+
+        Args:
+            state (DonationBucketState): The running per-candidate totals.
+            pred_date (str): The new prediction date, ignored unless after state.pred_date.
+
+        Returns:
+            np.ndarray: Sorted state positions of the candidates whose totals changed.
+        """
+        old_day = (pd.to_datetime(state.pred_date) - pd.Timestamp(0)).days
+        new_day = (pd.to_datetime(pred_date) - pd.Timestamp(0)).days
+        if new_day <= old_day:
+            return np.zeros(0, dtype=np.int64)
+
+        return state.rebucket(
+            self.get_time_bucket_codes(state.recent_days - old_day),
+            self.get_time_bucket_codes(state.recent_days - new_day),
+            pd.to_datetime(pred_date).strftime("%Y-%m-%d"),
+        )
+
+    @traced("DataPreprocessing.engineer_features")
+    def engineer_features(self, chunksize=None, state_path=None):
         """
         Engineers features by merging and aggregating data from loaded files.
 
+        Args:
+            chunksize (int): If set, the donations file is streamed this many rows at a time
+                into per-candidate running totals instead of being loaded in full.
+            state_path (str): If set, the running totals are saved there so later donations
+                can be applied with refresh_features. Implies streaming.
+
         Returns:
             pd.DataFrame: A DataFrame with all the feature and the target variable.
         """
+        if chunksize or state_path:
+            return self._engineer_features_streaming(chunksize or self.DEFAULT_CHUNKSIZE, state_path)
+
         try:
             label_df, donation_df, feature_df = self.load_data()
         except TypeError:
@@ -130,15 +543,10 @@ class DataPreprocessing:
 
         # Define range of valid dates and limit donation dates
         donation_df["trans_date"] = pd.to_datetime(donation_df["trans_date"])
-        min_year = 1950
-
-        pred_date = DataPreprocessing.CURRENT_DATE - relativedelta(years=5)
-        pred_date = pred_date.strftime("%Y-%m-%d")
-
-        pred_date = "2016-01-01"
+        pred_date = self.get_pred_date()
 
         donation_df = donation_df[
-            (donation_df["trans_date"].dt.year >= min_year)
+            (donation_df["trans_date"].dt.year >= self.MIN_YEAR)
             & (donation_df["trans_date"] <= pred_date)
         ].copy()
 
@@ -146,17 +554,11 @@ class DataPreprocessing:
         donation_df["days_from_prediction"] = (
             donation_df["trans_date"] - pd.to_datetime(pred_date)
         ).dt.days
-        bins = [-np.inf, -5 * 365, -4 * 365, -3 * 365, -2 * 365, -1 * 365, 0]
-        labels = [
-            "donation_historical",
-            "donation_p5yr",
-            "donation_p4yr",
-            "donation_p3yr",
-            "donation_p2yr",
-            "donation_p1yr",
-        ]
         donation_df["time_bucket"] = pd.cut(
-            donation_df["days_from_prediction"], bins=bins, labels=labels, ordered=True
+            donation_df["days_from_prediction"],
+            bins=self.TIME_BUCKET_BINS,
+            labels=self.TIME_BUCKET_LABELS,
+            ordered=True,
         )
 
         # Calculate backward cumulative sum and count features
@@ -187,6 +589,65 @@ class DataPreprocessing:
         )
         print(bucket_agg.head())
 
+        return self._finalize_features(bucket_agg, label_df, feature_df)
+
+    def _engineer_features_streaming(self, chunksize, state_path=None):
+        """
+        Engineers the same features as engineer_features without loading the donations.
+
+        Donations are read in chunks and folded into a DonationBucketState, so peak
+        memory is set by the number of candidates. Cumulative sums equal the in-memory
+        max of the running sum as long as donation amounts are not negative.
+
+        Args:
+            chunksize (int): Number of donation rows read at a time.
+            state_path (str): If set, the DonationBucketState is saved there.
+
+        Returns:
+            pd.DataFrame: A DataFrame with all the feature and the target variable.
+        """
+        try:
+            label_df, _, feature_df = self.load_data(keys=("label", "feature"))
+        except TypeError:
+            print("Data loading failed. Cannot engineer features.")
+            return None
+
+        donation_path = self.get_file_path("donation")
+        if label_df is None or donation_path is None or feature_df is None:
+            print("One or more datasets are None. Cannot engineer features.")
+            return None
+
+        print(f"Engineering features from donations in chunks of {chunksize} rows...")
+        pred_date = self.get_pred_date()
+        state = DonationBucketState(
+            label_df["candidate_id"].unique(), self.TIME_BUCKET_LABELS, pred_date=pred_date
+        )
+
+        for donation_chunk in pd.read_csv(donation_path, chunksize=chunksize):
+            donation_chunk = donation_chunk.rename(columns=self.COLUMN_RENAMES["donation"])
+            self.update_bucket_state(state, donation_chunk, pred_date)
+
+        logging.info(f"Donations streamed from {donation_path}.")
+        if state_path:
+            state.save(state_path)
+            logging.info(f"Donation bucket state saved to {state_path}.")
+        bucket_agg = state.to_bucket_agg()
+
+        return self._finalize_features(bucket_agg, label_df, feature_df)
+
+    @traced("DataPreprocessing.finalize_features", get_input=lambda self, bucket_agg, label_df, feature_df: feature_df)
+    def _finalize_features(self, bucket_agg, label_df, feature_df):
+        """
+        Pivots bucketed cumulative features and joins them to the labels and features.
+
+        Args:
+            bucket_agg (pd.DataFrame): cum_sum and cum_count indexed by candidate_id and time_bucket.
+            label_df (pd.DataFrame): The label DataFrame.
+            feature_df (pd.DataFrame): The feature DataFrame.
+
+        Returns:
+            pd.DataFrame: A DataFrame with all the feature and the target variable.
+        """
         # Pivot and Clean
         bucket_agg = bucket_agg.pivot_table(
             index="candidate_id",
@@ -235,10 +696,128 @@ class DataPreprocessing:
 
         full_df = label_df[["target"]].join(all_features, how="left").reset_index()
 
+        if self.compact_dtypes:
+            full_df, self.dtype_report = optimize_dtypes(full_df, **self.DTYPE_OPTIONS)
+            print(
+                f"Feature memory reduced from {self.dtype_report['bytes_before'] / 1e6:.1f} MB "
+                f"to {self.dtype_report['bytes_after'] / 1e6:.1f} MB."
+            )
+
         print("Feature engineering completed.")
 
         return full_df
 
+    @traced("DataPreprocessing.refresh_features")
+    def refresh_features(self, full_df, delta_path, state_path, pred_date=None):
+        """
+        Applies a file of new donations to a full_df built by engineer_features.
+
+        The state saved with engineer_features(state_path=...) is first moved to the new
+        prediction date, then the delta is added to it. Only the donation_*_cum_sum,
+        _cum_count and _cum_avg columns of the candidates whose totals changed are
+        recomputed. The updated state is saved back to state_path.
+
+        Args:
+            full_df (pd.DataFrame): The engineered features, updated in place.
+            delta_path (str): CSV of new donations in the same format as the donations file.
+            state_path (str): Path of the saved DonationBucketState.
+            pred_date (str): The new prediction date. If None, the latest donation date of
+                the delta, or the state's prediction date if that is later.
+
+        Returns:
+            pd.DataFrame: The updated full_df.
+        """
+        state = DonationBucketState.load(state_path)
+        delta_df = pd.read_csv(delta_path).rename(columns=self.COLUMN_RENAMES["donation"])
+        if pred_date is None:
+            pred_date = max(pd.to_datetime(state.pred_date), pd.to_datetime(delta_df["trans_date"]).max())
+        moved_rows = self.advance_bucket_state(state, pred_date)
+        rows = np.union1d(moved_rows, self.update_bucket_state(state, delta_df, state.pred_date))
+        state.save(state_path)
+
+        if len(rows) == 0:
+            print("No candidates affected by new donations.")
+            return full_df
+
+        candidate_ids = state.candidate_index[rows]
+        positions = pd.Index(full_df["candidate_id"]).get_indexer(candidate_ids)
+
+        # candidates without donations before have no donation or feature columns yet
+        count_cols = [f"{bucket}_cum_count" for bucket in state.bucket_labels if f"{bucket}_cum_count" in full_df.columns]
+        is_new = full_df[count_cols].iloc[positions].isna().all(axis=1).to_numpy()
+
+        # compact columns may not hold the refreshed values, widen them while writing
+        donation_cols = [
+            f"{bucket}_{stat}" for bucket in state.bucket_labels for stat in ("cum_sum", "cum_count", "cum_avg")
+            if f"{bucket}_{stat}" in full_df.columns
+        ]
+        self._widen_columns(full_df, donation_cols)
+        refreshed_cols = list(donation_cols)
+
+        cum_sum, cum_count = state.get_cumulative(rows)
+        has_bucket = state.counts[rows] > 0
+        cum_sum = np.where(has_bucket, cum_sum, 0)
+        cum_count = np.where(has_bucket, cum_count, 0)
+
+        for i, bucket in enumerate(state.bucket_labels):
+            cum_sum_col = f"{bucket}_cum_sum"
+            cum_count_col = f"{bucket}_cum_count"
+            cum_avg_col = f"{bucket}_cum_avg"
+            if cum_sum_col in full_df.columns:
+                full_df.loc[full_df.index[positions], cum_sum_col] = cum_sum[:, i]
+            if cum_count_col in full_df.columns:
+                full_df.loc[full_df.index[positions], cum_count_col] = cum_count[:, i]
+            if cum_avg_col in full_df.columns:
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    cum_avg = np.nan_to_num(cum_sum[:, i] / cum_count[:, i], nan=0.0)
+                full_df.loc[full_df.index[positions], cum_avg_col] = cum_avg
+
+        if is_new.any():
+            new_ids = candidate_ids[is_new]
+            new_features = self.load_feature_rows(new_ids)
+            feature_cols = [col for col in new_features.columns if col in full_df.columns]
+            self._widen_columns(full_df, feature_cols)
+            refreshed_cols += feature_cols
+            for col in feature_cols:
+                full_df.loc[full_df.index[positions[is_new]], col] = new_features[col].to_numpy()
+
+        if self.compact_dtypes:
+            compact_df, _ = optimize_dtypes(full_df[refreshed_cols], **self.DTYPE_OPTIONS)
+            full_df[refreshed_cols] = compact_df
+
+        print(f"Features refreshed for {len(rows)} candidates.")
+
+        return full_df
+
+    def load_feature_rows(self, candidate_ids, chunksize=None):
+        """
+        Reads the feature rows of a few candidates, streaming the feature file.
+
+        Args:
+            candidate_ids (array-like): Ids of the candidates to read.
+            chunksize (int): Number of feature rows read at a time, DEFAULT_CHUNKSIZE if None.
+
+        Returns:
+            pd.DataFrame: The features indexed by candidate_id, in the order of candidate_ids,
+                with NaN rows for candidates missing from the file.
+        """
+        candidate_ids = pd.Index(candidate_ids, name="candidate_id")
+        chunks = []
+        for feature_chunk in pd.read_csv(self.get_file_path("feature"), chunksize=chunksize or self.DEFAULT_CHUNKSIZE):
+            feature_chunk = feature_chunk.rename(columns=self.COLUMN_RENAMES["feature"])
+            chunks.append(feature_chunk[feature_chunk["candidate_id"].isin(candidate_ids)])
+        return pd.concat(chunks).drop_duplicates("candidate_id").set_index("candidate_id").reindex(candidate_ids)
+
+    def _widen_columns(self, df, columns):
+        widened = {}
+        for col in columns:
+            if isinstance(df[col].dtype, pd.CategoricalDtype):
+                widened[col] = df[col].astype(object)
+            elif pd.api.types.is_numeric_dtype(df[col]) and not pd.api.types.is_bool_dtype(df[col]):
+                widened[col] = df[col].astype(np.float64)
+        for col, series in widened.items():
+            df[col] = series
+
 
 if __name__ == "__main__":
     file_path = "/Users/auroraleport/Desktop/MyGit/IndependentProjects/Windfall_aleport/data/raw/windfall_ds_challenge"
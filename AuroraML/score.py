@@ -0,0 +1,157 @@
+# This file contains the batch scoring entry point for trained models.
+import argparse
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+
+def load_feature_names(colnames_path):
+    """
+    Loads the ordered feature names a model was trained on.
+
+    Args:
+        colnames_path (str): Pickle of either a list of names or a {"f0": name, ...} dict
+            as saved next to the Windfall models.
+
+    Returns:
+        list: Feature names in model column order.
+    """
+    with open(colnames_path, "rb") as f:
+        colnames = pickle.load(f)
+
+    if isinstance(colnames, dict):
+        return [colnames[f"f{i}"] for i in range(len(colnames))]
+    return list(colnames)
+
+
+class BatchScorer:
+    """
+    Scores candidates in fixed-size chunks with a model loaded once.
+    """
+
+    def __init__(self, model_path, colnames_path, id_column="candidate_id", n_workers=2):
+        """
+        Loads the model artifact and its feature names.
+
+        Args:
+            model_path (str): Pickled xgboost Booster, e.g. models/*-model.pickle.dat.
+            colnames_path (str): Pickled feature names, e.g. data/params/*-colnames.pkl.
+            id_column (str): Column holding the candidate id in the input file.
+            n_workers (int): Number of chunks scored concurrently. With inplace_predict the
+                machine's cores are split between them. Older boosters (e.g. xgboost 0.90)
+                predict one chunk at a time on all cores, while the other workers parse and
+                align the next chunks.
+        """
+        with open(model_path, "rb") as f:
+            self.booster = pickle.load(f)
+        self.feature_names = load_feature_names(colnames_path)
+        self.id_column = id_column
+        self.n_workers = max(1, n_workers)
+
+        # inplace_predict is thread safe, older boosters are serialized behind a lock
+        self._inplace = hasattr(self.booster, "inplace_predict")
+        self._lock = threading.Lock()
+        # a booster trained on named features rejects an unnamed DMatrix, align() has put
+        # the columns in model order so the booster's own names label them
+        self._dmatrix_feature_names = getattr(self.booster, "feature_names", None)
+        # a serialized booster keeps every core, only concurrent predictions split them
+        n_predicting = self.n_workers if self._inplace else 1
+        self.booster.set_param({"nthread": max(1, (os.cpu_count() or 1) // n_predicting)})
+
+        logging.info(f"Model loaded from {model_path} with {len(self.feature_names)} features.")
+
+    def align(self, chunk):
+        """
+        Orders a chunk's columns as the model expects, missing features become NaN.
+
+        Args:
+            chunk (pd.DataFrame): Candidate features.
+
+        Returns:
+            np.ndarray: A float32 matrix in model column order.
+        """
+        return chunk.reindex(columns=self.feature_names).to_numpy(dtype=np.float32)
+
+    def predict(self, X):
+        """
+        Scores an aligned feature matrix.
+
+        Args:
+            X (np.ndarray): Output of align().
+
+        Returns:
+            np.ndarray: Predicted probabilities.
+        """
+        if self._inplace:
+            return self.booster.inplace_predict(X)
+        dmatrix = xgb.DMatrix(X, missing=np.nan, feature_names=self._dmatrix_feature_names)
+        with self._lock:
+            return self.booster.predict(dmatrix)
+
+    def score_file(self, input_path, output_path, chunksize=100_000):
+        """
+        Streams a candidate file through the model and writes ID,Ypred as it goes.
+
+        At most n_workers + 1 chunks are held at once, so memory does not grow
+        with the size of the input.
+
+        Args:
+            input_path (str): CSV with the id column and the model features.
+            output_path (str): CSV written with columns ID and Ypred.
+            chunksize (int): Number of candidates per chunk.
+
+        Returns:
+            dict: Rows scored, seconds taken and rows per second.
+        """
+        start = time.perf_counter()
+        n_rows = 0
+        pending = deque()
+
+        def write(future, ids, f, header):
+            pd.DataFrame({"ID": ids, "Ypred": future.result()}).to_csv(f, header=header, index=False)
+            return len(ids)
+
+        with open(output_path, "w", newline="") as f, ThreadPoolExecutor(max_workers=self.n_workers) as executor:
+            for chunk in pd.read_csv(input_path, chunksize=chunksize):
+                ids = chunk[self.id_column].to_numpy()
+                pending.append((executor.submit(self.predict, self.align(chunk)), ids))
+
+                # write finished chunks in input order before reading more
+                while len(pending) > self.n_workers:
+                    future, ids = pending.popleft()
+                    n_rows += write(future, ids, f, header=n_rows == 0)
+                    logging.info(f"Scored {n_rows} rows ({n_rows / (time.perf_counter() - start):.0f} rows/sec).")
+
+            while pending:
+                future, ids = pending.popleft()
+                n_rows += write(future, ids, f, header=n_rows == 0)
+
+        seconds = time.perf_counter() - start
+        stats = {"rows": n_rows, "seconds": seconds, "rows_per_sec": n_rows / seconds if seconds else 0.0}
+        print(f"Scored {n_rows} rows in {seconds:.1f}s ({stats['rows_per_sec']:.0f} rows/sec).")
+
+        return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score candidates in chunks with a trained model.")
+    parser.add_argument("input_path", help="CSV of candidate features.")
+    parser.add_argument("output_path", help="CSV written with columns ID and Ypred.")
+    parser.add_argument("--model", required=True, help="Pickled xgboost model.")
+    parser.add_argument("--colnames", required=True, help="Pickled feature names of the model.")
+    parser.add_argument("--id-column", default="candidate_id")
+    parser.add_argument("--chunksize", type=int, default=100_000)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    scorer = BatchScorer(args.model, args.colnames, id_column=args.id_column, n_workers=args.workers)
+    scorer.score_file(args.input_path, args.output_path, chunksize=args.chunksize)
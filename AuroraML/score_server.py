@@ -0,0 +1,196 @@
+# This file contains a long-lived local scoring service with request micro-batching.
+import argparse
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from score import BatchScorer
+
+
+class ScoringServer:
+    """
+    Serves per-candidate scores over a local socket from a model loaded once.
+
+    Concurrent requests are coalesced into micro-batches: a batch is scored as soon as
+    it holds max_batch_size requests, or once its oldest request has waited max_latency_ms
+    and no other request is queued.
+
+    Protocol: one JSON object per line. {"id": ..., "features": {name: value}} is answered
+    with {"id": ..., "score": float}; {"cmd": "stats"} with the latency and throughput counters.
+    Requests of one connection are handled concurrently, so they can share a batch with each
+    other, and responses are written as they complete, not necessarily in request order.
+    """
+
+    def __init__(self, scorer, max_batch_size=256, max_latency_ms=5.0, latency_window=10_000):
+        """
+        Initializes the server around a loaded scorer.
+
+        Args:
+            scorer (BatchScorer): Holds the model and its feature order.
+            max_batch_size (int): Largest number of requests scored together.
+            max_latency_ms (float): Longest time a request waits for its batch to fill.
+            latency_window (int): Number of recent request latencies kept for percentiles.
+        """
+        self.scorer = scorer
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency_ms / 1000.0
+        self.latencies = deque(maxlen=latency_window)
+        self.n_requests = 0
+        self.n_batches = 0
+        self.started_at = time.perf_counter()
+        self._queue = None
+
+    def warm_up(self):
+        """
+        Runs one prediction so the first request does not pay for lazy initialization.
+        """
+        self.scorer.predict(self.scorer.align(pd.DataFrame([{}])))
+
+    async def score(self, features):
+        """
+        Scores one candidate through the micro-batcher.
+
+        Args:
+            features (dict): Feature values by name, missing features are NaN.
+
+        Returns:
+            float: The predicted probability.
+
+        Raises:
+            ValueError: If a feature value is not numeric. The request is rejected before it
+                joins a batch, so it does not fail the other requests.
+        """
+        row = self.scorer.align(pd.DataFrame([features]))
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((row, future, time.perf_counter()))
+        return await future
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = batch[0][2] + self.max_latency
+            while len(batch) < self.max_batch_size:
+                # requests already waiting join the batch even past its deadline, under a
+                # backlog the deadline has passed by the time the first one is dequeued
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                X = np.vstack([row for row, _, _ in batch])
+                scores = await loop.run_in_executor(None, self.scorer.predict, X)
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            now = time.perf_counter()
+            for (_, future, received), score in zip(batch, scores):
+                if not future.done():
+                    future.set_result(float(score))
+                self.latencies.append(now - received)
+            self.n_requests += len(batch)
+            self.n_batches += 1
+
+    def get_stats(self):
+        """
+        Returns the latency and throughput counters.
+
+        Returns:
+            dict: Request and batch counts, mean batch size, requests per second since
+                start and p50/p99 latency in milliseconds over the recent window.
+        """
+        uptime = time.perf_counter() - self.started_at
+        latencies_ms = np.array(self.latencies) * 1000.0
+        return {
+            "requests": self.n_requests,
+            "batches": self.n_batches,
+            "mean_batch_size": self.n_requests / self.n_batches if self.n_batches else 0.0,
+            "requests_per_sec": self.n_requests / uptime if uptime else 0.0,
+            "p50_ms": float(np.percentile(latencies_ms, 50)) if len(latencies_ms) else None,
+            "p99_ms": float(np.percentile(latencies_ms, 99)) if len(latencies_ms) else None,
+        }
+
+    async def _handle_request(self, line, writer, write_lock):
+        request = {}
+        try:
+            request = json.loads(line)
+            if request.get("cmd") == "stats":
+                response = self.get_stats()
+            else:
+                response = {"id": request.get("id"), "score": await self.score(request["features"])}
+        except Exception as e:
+            response = {"id": request.get("id") if isinstance(request, dict) else None, "error": str(e)}
+        async with write_lock:
+            writer.write((json.dumps(response) + "\n").encode())
+            await writer.drain()
+
+    async def _handle_client(self, reader, writer):
+        write_lock = asyncio.Lock()
+        tasks = set()
+        try:
+            # read the next request without waiting for the previous one to be scored
+            while line := await reader.readline():
+                task = asyncio.create_task(self._handle_request(line, writer, write_lock))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8765):
+        """
+        Warms the model and serves requests until cancelled.
+
+        Args:
+            host (str): Local address to bind.
+            port (int): Port to bind.
+        """
+        self._queue = asyncio.Queue()
+        self.warm_up()
+        self.started_at = time.perf_counter()
+        batcher = asyncio.create_task(self._batch_loop())
+
+        server = await asyncio.start_server(self._handle_client, host, port)
+        logging.info(f"Scoring server listening on {host}:{port}.")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve model scores over a local socket.")
+    parser.add_argument("--model", required=True, help="Pickled xgboost model.")
+    parser.add_argument("--colnames", required=True, help="Pickled feature names of the model.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--max-batch-size", type=int, default=256)
+    parser.add_argument("--max-latency-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    server = ScoringServer(
+        BatchScorer(args.model, args.colnames, n_workers=1),
+        max_batch_size=args.max_batch_size,
+        max_latency_ms=args.max_latency_ms,
+    )
+    asyncio.run(server.serve(args.host, args.port))
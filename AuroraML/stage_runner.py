@@ -0,0 +1,373 @@
+# This file contains a small runner for pipeline stages with a content-addressed on-disk cache.
+import hashlib
+import inspect
+import json
+import logging
+import os
+import time
+
+import joblib
+
+from data_cache import hash_file
+from instrumentation import get_tracer
+
+
+def hash_code(obj):
+    """
+    Hashes the source code of a function, class or module.
+
+    Args:
+        obj: The function, class or module.
+
+    Returns:
+        str: The hex digest of its source, or of its qualified name if the source is unavailable.
+    """
+    try:
+        source = inspect.getsource(obj)
+    except (OSError, TypeError):
+        source = f"{getattr(obj, '__module__', '')}.{getattr(obj, '__qualname__', repr(obj))}"
+    return hashlib.blake2b(source.encode(), digest_size=16).hexdigest()
+
+
+class Stage:
+    """
+    A step of the pipeline: a function of the outputs of earlier stages.
+
+    The function is called with the outputs of the input stages as positional arguments,
+    in order, and the config as keyword arguments.
+    """
+
+    def __init__(self, name, func, inputs=(), config=None, files=(), code=(), cache=True, outputs=()):
+        """
+        Initializes the stage.
+
+        Args:
+            name (str): Unique name of the stage.
+            func (callable): Computes the stage output.
+            inputs (list): Names of the stages whose outputs are passed to func.
+            config (dict): Keyword arguments of func, must be JSON serializable.
+            files (list): Source files read by func. Their content is part of the cache key.
+            code (list): Functions, classes or modules called by func. Their source is part of
+                the cache key, next to the source of func itself.
+            cache (bool): Store the output in the cache. Stages with side effects, e.g. writing
+                reports, should not be cached.
+            outputs (list): Files written by func next to its return value, e.g. a model artifact.
+                A cached stage is recomputed when one of them is missing or has changed.
+        """
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.config = dict(config or {})
+        self.files = list(files)
+        self.code = list(code)
+        self.cache = cache
+        self.outputs = list(outputs)
+
+    def get_code_hash(self):
+        """
+        Returns:
+            str: A hash of the source of func and of every object in code.
+        """
+        return hashlib.blake2b(
+            "|".join(hash_code(obj) for obj in [self.func] + self.code).encode(), digest_size=16
+        ).hexdigest()
+
+
+class ArtifactStore:
+    """
+    A local cache of stage outputs, each stored as a joblib file next to a JSON record.
+
+    Entries are named after their key. The record keeps the content hash of the output,
+    its size and when it was last used. Once the total size goes over max_bytes, the least
+    recently used entries are evicted.
+    """
+
+    FILE_HASHES = "file_hashes.json"
+
+    def __init__(self, cache_dir, max_bytes=20 * 1024 ** 3):
+        """
+        Initializes the store in a local directory.
+
+        Args:
+            cache_dir (str): Directory holding the artifacts, created if missing.
+            max_bytes (int): Size limit of the stored artifacts.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self.file_hashes = {}
+        file_hashes_path = os.path.join(cache_dir, self.FILE_HASHES)
+        if os.path.exists(file_hashes_path):
+            with open(file_hashes_path) as f:
+                self.file_hashes = json.load(f)
+
+    def get_entry_paths(self, key):
+        """
+        Returns:
+            tuple: The joblib and JSON paths of the entry.
+        """
+        return (
+            os.path.join(self.cache_dir, f"{key}.joblib"),
+            os.path.join(self.cache_dir, f"{key}.json"),
+        )
+
+    def hash_file(self, file_path):
+        """
+        Hashes a source file, reusing the stored hash while its size and mtime are unchanged.
+
+        Args:
+            file_path (str): Path of the source file.
+
+        Returns:
+            str: The hex digest of the file content.
+        """
+        path = os.path.abspath(file_path)
+        stat = os.stat(path)
+        stored = self.file_hashes.get(path)
+        if stored and stored["size"] == stat.st_size and stored["mtime_ns"] == stat.st_mtime_ns:
+            return stored["content_hash"]
+
+        content_hash = hash_file(path)
+        self.file_hashes[path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "content_hash": content_hash}
+        self._write_json(os.path.join(self.cache_dir, self.FILE_HASHES), self.file_hashes)
+        return content_hash
+
+    def get_meta(self, key):
+        """
+        Returns:
+            dict: The record of the entry, or None if the entry is missing.
+        """
+        data_path, meta_path = self.get_entry_paths(key)
+        if not (os.path.exists(meta_path) and os.path.exists(data_path)):
+            return None
+        with open(meta_path) as f:
+            return json.load(f)
+
+    def touch(self, key, meta):
+        """
+        Marks an entry as used now.
+        """
+        meta["last_used"] = time.time()
+        self._write_json(self.get_entry_paths(key)[1], meta)
+
+    def load(self, key):
+        """
+        Loads the output stored under a key.
+
+        Args:
+            key (str): The entry key.
+
+        Returns:
+            The stored output.
+        """
+        data_path, _ = self.get_entry_paths(key)
+        return joblib.load(data_path)
+
+    def save(self, key, value, stage_name, keep=(), output_files=()):
+        """
+        Stores an output under a key, then evicts least recently used entries over the size limit.
+
+        Args:
+            key (str): The entry key.
+            value: The output, anything joblib can pickle.
+            stage_name (str): Name of the stage, kept in the record.
+            keep (tuple): Other keys not to evict, e.g. the entries of the current run.
+            output_files (tuple): Files written by the stage, their content hashes are kept in the record.
+
+        Returns:
+            dict: The record of the entry.
+        """
+        data_path, meta_path = self.get_entry_paths(key)
+        tmp_path = f"{data_path}.tmp"
+        joblib.dump(value, tmp_path, compress=0)
+        os.replace(tmp_path, data_path)
+
+        meta = {
+            "stage": stage_name,
+            "content_hash": hash_file(data_path),
+            "size": os.path.getsize(data_path),
+            "created_at": time.time(),
+            "last_used": time.time(),
+            "outputs": {os.path.abspath(path): self.hash_file(path) for path in output_files},
+        }
+        self._write_json(meta_path, meta)
+        self.evict(keep=(key,) + tuple(keep))
+        return meta
+
+    def evict(self, keep=()):
+        """
+        Removes the least recently used entries until the store fits in max_bytes.
+
+        Args:
+            keep (tuple): Keys never evicted, e.g. the entry just written.
+
+        Returns:
+            list: The evicted keys.
+        """
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json") or name == self.FILE_HASHES:
+                continue
+            key = name[:-len(".json")]
+            meta = self.get_meta(key)
+            if meta:
+                entries.append((meta["last_used"], key, meta["size"]))
+
+        total = sum(size for _, _, size in entries)
+        evicted = []
+        for _, key, size in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if key in keep:
+                continue
+            for path in self.get_entry_paths(key):
+                os.remove(path)
+            total -= size
+            evicted.append(key)
+            logging.info(f"Evicted cache entry {key} ({size / 1e6:.1f} MB).")
+
+        if total > self.max_bytes:
+            logging.warning(f"Cache {self.cache_dir} holds {total / 1e6:.1f} MB, over its limit of "
+                            f"{self.max_bytes / 1e6:.1f} MB.")
+        return evicted
+
+    def _write_json(self, path, data):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+
+class StageRunner:
+    """
+    Runs a DAG of stages, recomputing only the stages whose key changed.
+
+    The key of a stage hashes its name, code, config, source files and the content hashes
+    of its input stage outputs. A stage whose inputs were recomputed to the same content is
+    therefore still read from the cache. Cached outputs are only loaded when a later stage
+    needs them or they are requested.
+    """
+
+    def __init__(self, stages, store):
+        """
+        Initializes the runner.
+
+        Args:
+            stages (list): Stages in topological order, inputs before the stages using them.
+            store (ArtifactStore): The cache of stage outputs.
+        """
+        self.stages = {}
+        for stage in stages:
+            if stage.name in self.stages:
+                raise ValueError(f"Duplicate stage name {stage.name!r}.")
+            missing = [name for name in stage.inputs if name not in self.stages]
+            if missing:
+                raise ValueError(f"Stage {stage.name!r} uses {missing}, which are not defined before it.")
+            self.stages[stage.name] = stage
+        self.store = store
+        self.run_log = []
+
+    def get_key(self, stage, input_hashes):
+        """
+        Computes the cache key of a stage.
+
+        Args:
+            stage (Stage): The stage.
+            input_hashes (list): Content hashes of the outputs of its input stages.
+
+        Returns:
+            str: The key.
+        """
+        description = {
+            "stage": stage.name,
+            "code": stage.get_code_hash(),
+            "config": stage.config,
+            "inputs": input_hashes,
+            "files": {os.path.abspath(path): self.store.hash_file(path) for path in stage.files},
+        }
+        return hashlib.blake2b(
+            json.dumps(description, sort_keys=True, default=str).encode(), digest_size=16
+        ).hexdigest()
+
+    def has_outputs(self, stage, meta):
+        """
+        Checks that the files a cached stage wrote are still the ones it wrote.
+
+        Args:
+            stage (Stage): The stage.
+            meta (dict): The record of its cache entry.
+
+        Returns:
+            bool: True if every output file exists with the content hash in the record.
+        """
+        recorded = meta.get("outputs", {})
+        for path in map(os.path.abspath, stage.outputs):
+            if not os.path.exists(path) or recorded.get(path) != self.store.hash_file(path):
+                return False
+        return True
+
+    def run(self, targets=None, force=()):
+        """
+        Runs the stages needed for the targets.
+
+        Args:
+            targets (list): Names of the stages whose outputs are returned, the last stage if None.
+            force (tuple): Names of stages recomputed even when they are cached.
+
+        Returns:
+            dict: The output of each target stage.
+        """
+        targets = list(targets or [list(self.stages)[-1]])
+
+        # stages the targets depend on, in order
+        needed = set()
+        for name in reversed(list(self.stages)):
+            if name in targets or name in needed:
+                needed.update([name] + self.stages[name].inputs)
+        order = [name for name in self.stages if name in needed]
+
+        keys, content_hashes, outputs = {}, {}, {}
+        self.run_log = []
+
+        def get_output(name):
+            if name not in outputs:
+                outputs[name] = self.store.load(keys[name])
+            return outputs[name]
+
+        for name in order:
+            stage = self.stages[name]
+            keys[name] = self.get_key(stage, [content_hashes[i] for i in stage.inputs])
+
+            meta = self.store.get_meta(keys[name]) if stage.cache and name not in force else None
+            if meta and not self.has_outputs(stage, meta):
+                logging.info(f"Stage {name} is cached but its output files are missing or changed.")
+                meta = None
+            if meta:
+                self.store.touch(keys[name], meta)
+                content_hashes[name] = meta["content_hash"]
+                self.run_log.append({"stage": name, "key": keys[name], "status": "cached", "seconds": 0.0})
+                logging.info(f"Stage {name} is cached as {keys[name]}.")
+                continue
+
+            print(f"Running stage {name}...")
+            start = time.perf_counter()
+            with get_tracer().stage(f"stage:{name}") as span:
+                output = stage.func(*[get_output(i) for i in stage.inputs], **stage.config)
+                span.set_output(output)
+            seconds = time.perf_counter() - start
+            if output is None:
+                raise RuntimeError(f"Stage {name} returned no output.")
+
+            outputs[name] = output
+            if stage.cache:
+                content_hashes[name] = self.store.save(
+                    keys[name], output, name, keep=tuple(keys.values()), output_files=stage.outputs
+                )["content_hash"]
+            else:
+                content_hashes[name] = keys[name]
+            self.run_log.append({"stage": name, "key": keys[name], "status": "computed", "seconds": seconds})
+            logging.info(f"Stage {name} computed in {seconds:.2f}s.")
+
+        self.store.evict(keep=tuple(keys.values()))
+        return {name: get_output(name) for name in targets}
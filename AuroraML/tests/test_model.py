@@ -0,0 +1,28 @@
+from model import Model
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.compose import ColumnTransformer
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+
+class TestSaveArtifact:
+    @pytest.fixture
+    def pipeline(self):
+        rng = np.random.default_rng(0)
+        X = pd.DataFrame(rng.random((50, 2)), columns=["NetWorth", "age"])
+        y = (X["NetWorth"] > 0.5).astype(int)
+        preprocessor = ColumnTransformer([("num", StandardScaler(), ["NetWorth", "age"])], n_jobs=2)
+        return Pipeline([("preprocessor", preprocessor), ("classifier", LogisticRegression())]).fit(X, y)
+
+    def test_keeps_callers_n_jobs(self, pipeline, tmp_path):
+        model = Model(pd.DataFrame())
+        model.schema = {}
+        artifact_path = str(tmp_path / "model.joblib")
+        model.save_artifact(pipeline, artifact_path)
+
+        assert pipeline.named_steps["preprocessor"].n_jobs == 2
+        saved, _ = Model.load_artifact(artifact_path)
+        assert saved.named_steps["preprocessor"].n_jobs is None
@@ -0,0 +1,120 @@
+from preprocessing import DataPreprocessing
+import os
+import numpy as np
+import pandas as pd
+import pytest
+
+
+PRED_DATE = pd.Timestamp("2016-01-01")
+
+
+class TestEngineerFeatures:
+    @pytest.fixture
+    def file_paths(self, tmp_path):
+        def day(offset):
+            return (PRED_DATE + pd.Timedelta(days=offset)).strftime("%Y-%m-%d")
+
+        rows = [
+            # the prediction date and every bucket edge, from p1yr to historical
+            *[(1, day(offset), 10.0 + i)
+              for i, offset in enumerate([0, -364, -365, -366, -730, -1095, -1460, -1825, -1826, -4000])],
+            # after the prediction date or before MIN_YEAR, both dropped
+            (1, day(1), 500.0),
+            (1, "1949-12-31", 500.0),
+            # only donations after the prediction date
+            (3, day(30), 20.0),
+            # a donation without amount counts, with amount 0
+            (4, day(-100), np.nan),
+            (4, day(-100), 7.5),
+            (4, day(-2000), 2.5),
+            # not in the labels
+            (9, day(-10), 99.0),
+        ]
+        pd.DataFrame(rows, columns=["cand_id", "trans_date", "amount"]).to_csv(tmp_path / "donation.csv", index=False)
+        # candidate 2 has no donations at all
+        pd.DataFrame({"cand_id": [1, 2, 3, 4], "ideal_donor": [1, 0, 0, 1]}).to_csv(tmp_path / "label.csv", index=False)
+        pd.DataFrame({
+            "cand_id": [1, 2, 3, 4],
+            "NetWorth": [1e5, 2e5, 3e5, 4e5],
+            "state": ["CA", "NY", "CA", "TX"],
+        }).to_csv(tmp_path / "feature.csv", index=False)
+        return [str(tmp_path / name) for name in ("label.csv", "donation.csv", "feature.csv")]
+
+    def get_preprocessing(self, file_paths, pred_date=PRED_DATE, compact_dtypes=False):
+        data_preprocessing = DataPreprocessing(file_paths, compact_dtypes=compact_dtypes)
+        data_preprocessing.get_pred_date = lambda: pred_date.strftime("%Y-%m-%d")
+        return data_preprocessing
+
+    def engineer(self, file_paths, pred_date=PRED_DATE, compact_dtypes=False, **kwargs):
+        return self.get_preprocessing(file_paths, pred_date, compact_dtypes).engineer_features(**kwargs)
+
+    def test_in_memory_buckets(self, file_paths):
+        full_df = self.engineer(file_paths).set_index("candidate_id")
+
+        # 10 donations up to the prediction date, the last at -4000 days
+        assert full_df.loc[1, "donation_historical_cum_count"] == 10
+        assert full_df.loc[1, "donation_historical_cum_sum"] == sum(10.0 + i for i in range(10))
+        # p1yr holds 0 and -364, p2yr -365 and -366, -730 is already in p3yr
+        assert full_df.loc[1, "donation_p2yr_cum_count"] == 4
+        assert full_df.loc[1, "donation_p2yr_cum_sum"] == 10.0 + 11.0 + 12.0 + 13.0
+        assert full_df.loc[4, "donation_historical_cum_count"] == 3
+        assert full_df.loc[4, "donation_historical_cum_sum"] == 10.0
+        assert full_df.loc[4, "donation_historical_cum_avg"] == pytest.approx(10.0 / 3)
+        # a bucket without donations is 0, not the running total of the later buckets
+        assert full_df.loc[4, "donation_p5yr_cum_count"] == 0
+        # candidates without donations up to the prediction date have no donation features
+        assert full_df.loc[[2, 3], "donation_historical_cum_count"].isna().all()
+        assert 9 not in full_df.index
+
+    @pytest.mark.parametrize("chunksize", [1, 3, 1000])
+    def test_streaming_matches_in_memory(self, file_paths, chunksize):
+        expected = self.engineer(file_paths)
+        result = self.engineer(file_paths, chunksize=chunksize)
+
+        # the running totals are float64, the in-memory cumsum keeps the amount dtype
+        cum_sum_cols = [col for col in result.columns if col.endswith("_cum_sum")]
+        assert (result[cum_sum_cols].dtypes == np.float64).all()
+        pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+    @pytest.mark.parametrize("chunksize", [1, 1000])
+    def test_streaming_matches_in_memory_compact(self, file_paths, chunksize):
+        expected = self.engineer(file_paths, compact_dtypes=True)
+        result = self.engineer(file_paths, compact_dtypes=True, chunksize=chunksize)
+
+        pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+        # the ids keep their dtype, only the features are downcast
+        assert result["candidate_id"].dtype == np.int64
+        assert result["NetWorth"].dtype == np.float32
+
+    def test_refresh_matches_recompute(self, file_paths, tmp_path):
+        state_path = str(tmp_path / "state.npz")
+        data_preprocessing = self.get_preprocessing(file_paths)
+        full_df = data_preprocessing.engineer_features(state_path=state_path)
+
+        new_pred_date = PRED_DATE + pd.Timedelta(days=60)
+        delta = pd.DataFrame({
+            "cand_id": [1, 2, 4, 4, 3],
+            "trans_date": [PRED_DATE + pd.Timedelta(days=d) for d in (10, 20, -3, 59, 90)],
+            "amount": [5.0, 40.0, 1.5, 2.0, 8.0],
+        })
+        delta.to_csv(tmp_path / "delta.csv", index=False)
+        # the donation file already holds donations after PRED_DATE, the refresh must count them
+        refreshed = data_preprocessing.refresh_features(
+            full_df, str(tmp_path / "delta.csv"), state_path, pred_date=new_pred_date.strftime("%Y-%m-%d")
+        )
+
+        recompute_dir = tmp_path / "recompute"
+        recompute_dir.mkdir()
+        recompute_paths = [str(recompute_dir / os.path.basename(path)) for path in file_paths]
+        for path, recompute_path in zip(file_paths, recompute_paths):
+            df = pd.read_csv(path)
+            if path.endswith("donation.csv"):
+                df = pd.concat([df, delta.astype({"trans_date": str})])
+            df.to_csv(recompute_path, index=False)
+        expected = self.engineer(recompute_paths, pred_date=new_pred_date)
+
+        pd.testing.assert_frame_equal(refreshed, expected, check_dtype=False)
+        # 10 donations up to PRED_DATE, the one a day after it and the one in the delta
+        refreshed = refreshed.set_index("candidate_id")
+        assert refreshed.loc[1, "donation_historical_cum_count"] == 12
+        assert refreshed.loc[1, "donation_historical_cum_sum"] == sum(10.0 + i for i in range(10)) + 500.0 + 5.0
@@ -0,0 +1,33 @@
+from score import BatchScorer
+import pickle
+import numpy as np
+import pandas as pd
+import pytest
+import xgboost as xgb
+
+
+class TestBatchScorer:
+    @pytest.fixture
+    def model_paths(self, tmp_path):
+        rng = np.random.default_rng(0)
+        X = pd.DataFrame(rng.random((200, 3)), columns=["NetWorth", "age", "propertyCount"])
+        y = (X["NetWorth"] > 0.5).astype(int)
+        booster = xgb.train({"objective": "binary:logistic", "max_depth": 2}, xgb.DMatrix(X, label=y), 5)
+
+        model_path, colnames_path = tmp_path / "model.pickle.dat", tmp_path / "colnames.pkl"
+        with open(model_path, "wb") as f:
+            pickle.dump(booster, f)
+        with open(colnames_path, "wb") as f:
+            pickle.dump({f"f{i}": name for i, name in enumerate(X.columns)}, f)
+        return str(model_path), str(colnames_path), X
+
+    def test_dmatrix_fallback_matches_inplace(self, model_paths):
+        model_path, colnames_path, X = model_paths
+        scorer = BatchScorer(model_path, colnames_path, n_workers=1)
+        # columns in another order and a missing one, align() restores the model's
+        chunk = X[["propertyCount", "NetWorth"]]
+        expected = scorer.predict(scorer.align(chunk))
+
+        # the path of boosters without inplace_predict, e.g. xgboost 0.90
+        scorer._inplace = False
+        np.testing.assert_allclose(scorer.predict(scorer.align(chunk)), expected, rtol=1e-6)
@@ -0,0 +1,59 @@
+from score_server import ScoringServer
+import asyncio
+import time
+import numpy as np
+
+
+class SlowScorer:
+    # stands in for BatchScorer, each prediction takes a few ms whatever the batch size
+    feature_names = ["a", "b"]
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def align(self, chunk):
+        return chunk.reindex(columns=self.feature_names).to_numpy(dtype=np.float32)
+
+    def predict(self, X):
+        self.batch_sizes.append(len(X))
+        time.sleep(0.005)
+        return X[:, 0] / 10
+
+
+class TestScoringServer:
+    def run_burst(self, server, n_requests):
+        async def burst():
+            server._queue = asyncio.Queue()
+            batcher = asyncio.create_task(server._batch_loop())
+            try:
+                return await asyncio.gather(*[server.score({"a": i, "b": 1}) for i in range(n_requests)])
+            finally:
+                batcher.cancel()
+
+        return asyncio.run(burst())
+
+    def test_burst_is_batched(self):
+        scorer = SlowScorer()
+        server = ScoringServer(scorer, max_batch_size=32, max_latency_ms=1.0)
+        scores = self.run_burst(server, 100)
+
+        assert scores == [np.float32(i) / 10 for i in range(100)]
+        assert sum(scorer.batch_sizes) == 100
+        assert max(scorer.batch_sizes) > 1
+        assert max(scorer.batch_sizes) <= 32
+        assert server.get_stats()["mean_batch_size"] > 1
+
+    def test_bad_request_fails_alone(self):
+        server = ScoringServer(SlowScorer(), max_latency_ms=1.0)
+
+        async def requests():
+            server._queue = asyncio.Queue()
+            batcher = asyncio.create_task(server._batch_loop())
+            try:
+                return await asyncio.gather(server.score({"a": 1}), server.score({"a": "x"}), return_exceptions=True)
+            finally:
+                batcher.cancel()
+
+        good, bad = asyncio.run(requests())
+        assert good == np.float32(1) / 10
+        assert isinstance(bad, ValueError)
@@ -0,0 +1,63 @@
+from stage_runner import ArtifactStore, Stage, StageRunner
+import os
+import pytest
+import model
+import preprocessing
+import train
+
+
+def make_numbers(n):
+    return list(range(n))
+
+
+def scale_numbers(numbers, factor):
+    return [number * factor for number in numbers]
+
+
+class TestStageRunner:
+    def run(self, stages, cache_dir):
+        runner = StageRunner(stages, ArtifactStore(str(cache_dir)))
+        outputs = runner.run()
+        return outputs, {entry["stage"]: entry["status"] for entry in runner.run_log}
+
+    def test_dependency_edit_reruns_stage(self, tmp_path):
+        dependency = tmp_path / "helper.py"
+        dependency.write_text("FACTOR = 2\n")
+        stages = [
+            Stage("numbers", make_numbers, config={"n": 3}),
+            Stage("scaled", scale_numbers, inputs=["numbers"], config={"factor": 2}, files=[str(dependency)]),
+        ]
+
+        _, status = self.run(stages, tmp_path / "cache")
+        assert status == {"numbers": "computed", "scaled": "computed"}
+        _, status = self.run(stages, tmp_path / "cache")
+        assert status == {"numbers": "cached", "scaled": "cached"}
+
+        dependency.write_text("FACTOR = 3  # edited\n")
+        outputs, status = self.run(stages, tmp_path / "cache")
+        assert status == {"numbers": "cached", "scaled": "computed"}
+        assert outputs == {"scaled": [0, 2, 4]}
+
+    @pytest.mark.parametrize("stage_name, module, attribute", [
+        ("features", preprocessing, "WINDFALL_FEATURE_MODULE"),
+        ("train", model, "WINDFALL_XGB_MODULE"),
+    ])
+    def test_windfall_module_edit_changes_key(self, tmp_path, monkeypatch, stage_name, module, attribute):
+        # a copy of the Windfall module stands in for the real one, which the test must not edit
+        windfall_copy = tmp_path / os.path.basename(getattr(module, attribute))
+        with open(getattr(module, attribute)) as f:
+            windfall_copy.write_text(f.read())
+        monkeypatch.setattr(module, attribute, str(windfall_copy))
+
+        file_paths = [tmp_path / name for name in ("label.csv", "donation.csv", "feature.csv")]
+        for path in file_paths:
+            path.write_text("cand_id\n1\n")
+        stages = train.build_stages([str(path) for path in file_paths])
+        runner = StageRunner(stages, ArtifactStore(str(tmp_path / "cache")))
+        stage = runner.stages[stage_name]
+        input_hashes = ["features"] if stage.inputs else []
+
+        key = runner.get_key(stage, input_hashes)
+        assert runner.get_key(stage, input_hashes) == key
+        windfall_copy.write_text(windfall_copy.read_text() + "\n# edited\n")
+        assert runner.get_key(stage, input_hashes) != key
@@ -1,31 +1,125 @@
 # this file is the main driver for the machine learning pipeline.
+import argparse
+import logging
+import os
 
 # Import necessary libraries and functions from separate modules
+import data_cache
+import model
+import preprocessing
+import Prod_QA
 from preprocessing import DataPreprocessing
-from model import train_model
+from model import Model
 from Prod_QA import ouput_qa_artifacts
+from stage_runner import ArtifactStore, Stage, StageRunner
+from instrumentation import Tracer
 
 FILE_PATH = '/Users/auroraleport/Desktop/MyGit/IndependentProjects/Windfall_aleport/data/raw/windfall_ds_challenge/'
 
+
+def engineer_features(file_paths, chunksize=None, csv_engine=None, compact_dtypes=True):
+    """
+    Loads the raw files and engineers the candidate features.
+
+    Returns:
+        pd.DataFrame: The features and the target, or None on error.
+    """
+    data_preprocessing = DataPreprocessing(file_paths, csv_engine=csv_engine, compact_dtypes=compact_dtypes)
+    return data_preprocessing.engineer_features(chunksize=chunksize)
+
+
+def train_model(full_df, **model_params):
+    """
+    Splits the features, fits the model pipeline and keeps the training and held out sets for QA.
+
+    Returns:
+        tuple: The fitted pipeline, X_train, X_test and y_test, or None on error.
+    """
+    model = Model(df=full_df, **model_params)
+    pipeline, X_test, y_test = model.preprocess_data()[:3]
+    if pipeline is None:
+        return None
+    return pipeline, model.X_train, X_test, y_test
+
+
+def run_qa(trained, output_dir="qa_artifacts"):
+    """
+    Writes the QA artifacts of the trained model, with the training features as drift reference.
+
+    Returns:
+        dict: The test metrics.
+    """
+    pipeline, X_train, X_test, y_test = trained
+    return ouput_qa_artifacts(pipeline, X_test, y_test, output_dir=output_dir, reference_df=X_train)
+
+
+def build_stages(file_paths, feature_config=None, model_config=None, qa_config=None):
+    """
+    Builds the stages of the pipeline: features -> train -> qa.
+
+    Args:
+        file_paths (list): The label, donation and feature files.
+        feature_config (dict): Keyword arguments of engineer_features.
+        model_config (dict): Keyword arguments of Model, e.g. estimator.
+        qa_config (dict): Keyword arguments of run_qa.
+
+    Returns:
+        list: The stages in order.
+    """
+    # the model artifact is written by the train stage, rerun it when the file is gone
+    artifact_path = (model_config or {}).get("artifact_path")
+    # the Windfall modules are loaded from their files and not imported, key the stages on
+    # their content like the data files
+    return [
+        Stage("features", engineer_features, config={"file_paths": file_paths, **(feature_config or {})},
+              files=list(file_paths) + [preprocessing.WINDFALL_FEATURE_MODULE], code=(preprocessing, data_cache)),
+        Stage("train", train_model, inputs=["features"], config=model_config, code=(model,),
+              files=[model.WINDFALL_XGB_MODULE], outputs=[artifact_path] if artifact_path else []),
+        Stage("qa", run_qa, inputs=["train"], config=qa_config, code=(Prod_QA,), cache=False),
+    ]
+
+
 def main():
     """
     Main function to run the entire ML pipeline.
+
+    Stage outputs are cached on disk, so a run only recomputes the stages whose code,
+    config or inputs changed, e.g. only train and qa after a model parameter change.
     """
-    DataPreprocessing = DataPreprocessing(["{FILE_PATH}/label.csv", f"{FILE_PATH}/donation.csv", f"{FILE_PATH}/feature.csv"])
-    
-    full_df = DataPreprocessing.engineer_features()
-    
-    X_train, X_test, y_train, y_test = DataPreprocessing.preprocess_data(full_df)
-    if X_train is None or y_train is None:
-        print("Pipleine is terminated due to data preprocessing error.")
-            return
-    
-    model = train_model(X_train, y_train)
-    if model is None:
-        print("Pipleine is terminated due to model training error.")
+    parser = argparse.ArgumentParser(description="Run the training pipeline with cached stages.")
+    parser.add_argument("--data-dir", default=FILE_PATH, help="Directory of label.csv, donation.csv and feature.csv.")
+    parser.add_argument("--cache-dir", default=".stage_cache", help="Directory of the cached stage outputs.")
+    parser.add_argument("--cache-size-gb", type=float, default=20.0, help="Size limit of the cache.")
+    parser.add_argument("--estimator", default="gbc", choices=Model.ESTIMATOR_BACKENDS)
+    parser.add_argument("--n-jobs", type=int, help="Processes transforming the training features, -1 for all cores.")
+    parser.add_argument("--chunksize", type=int, help="Stream the donations this many rows at a time.")
+    parser.add_argument("--output-dir", default="qa_artifacts")
+    parser.add_argument("--artifact-path", help="File the fitted model is saved to.")
+    parser.add_argument("--force", nargs="*", default=[], help="Stages recomputed even when cached.")
+    parser.add_argument("--trace", help="JSON file the run trace is written to, no tracing if omitted.")
+    parser.add_argument("--profile-stage", help="Traced stage run under cProfile, e.g. Model.preprocess_data.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    file_paths = [os.path.join(args.data_dir, name) for name in ("label.csv", "donation.csv", "feature.csv")]
+    stages = build_stages(
+        file_paths,
+        feature_config={"chunksize": args.chunksize},
+        model_config={"estimator": args.estimator, "n_jobs": args.n_jobs, "artifact_path": args.artifact_path},
+        qa_config={"output_dir": args.output_dir},
+    )
+    runner = StageRunner(stages, ArtifactStore(args.cache_dir, max_bytes=int(args.cache_size_gb * 1024 ** 3)))
+
+    try:
+        with Tracer(trace_path=args.trace, profile_stage=args.profile_stage, enabled=bool(args.trace)):
+            runner.run(force=args.force)
+    except RuntimeError as e:
+        print(f"Pipleine is terminated: {e}")
         return
-    
-    ouput_qa_artifacts(model, X_test, y_test)
+
+    for entry in runner.run_log:
+        print(f"{entry['stage']}: {entry['status']} ({entry['seconds']:.1f}s)")
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
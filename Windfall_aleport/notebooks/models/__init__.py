@@ -1,9 +1,14 @@
 from .train_predict_model_xgb_tpe import get_fixed_params
 from .train_predict_model_xgb_tpe import get_param_space
 from .train_predict_model_xgb_tpe import generate_obj_func
+from .train_predict_model_xgb_tpe import TuningData
+from .train_predict_model_xgb_tpe import cv_xgb_params
 #from .train_predict_model_xgb_tpe import obj_xgb
+from .train_predict_model_xgb_tpe import TrialStore
+from .train_predict_model_xgb_tpe import parallel_fmin
+from .train_predict_model_xgb_tpe import successive_halving_fmin
 from .train_predict_model_xgb_tpe import xgb_param_opt
 from .train_predict_model_xgb_tpe import xgb_fit_predict
 from .train_predict_model_xgb_tpe import xgb_pipeline
 
-__all__ = ['get_fixed_params', 'get_param_space', 'generate_obj_func', 'xgb_param_opt', 'xgb_fit_predict', 'xgb_pipeline']
\ No newline at end of file
+__all__ = ['get_fixed_params', 'get_param_space', 'generate_obj_func', 'TuningData', 'cv_xgb_params', 'TrialStore', 'parallel_fmin', 'successive_halving_fmin', 'xgb_param_opt', 'xgb_fit_predict', 'xgb_pipeline']
\ No newline at end of file
@@ -7,8 +7,19 @@ import xgboost as xgb
 from sklearn.model_selection import train_test_split
 from sklearn.model_selection import StratifiedKFold
 from sklearn.metrics import roc_auc_score, average_precision_score
-from hyperopt import fmin, hp, tpe, rand, Trials, STATUS_OK
+from hyperopt import fmin, hp, tpe, rand, Trials, STATUS_OK, space_eval, base, pyll
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import os
 import pickle
+import hashlib
+
+# record calls in the run trace when the AuroraML instrumentation is importable
+try:
+    from instrumentation import traced
+except ImportError:
+    def traced(name=None, get_input=None):
+        return lambda func: func
 
 # nested functions
 # https://www.analyticsvidhya.com/blog/2021/08/how-nested-functions-are-used-in-python/
@@ -26,7 +37,7 @@ XGB_bst_rounds = 500 #1000 #500 #3000
 XGB_early_stop_rounds = 30 #50
 
 evaluation_metrics = ['aucpr'] #auc #error
-verbose = 1
+verbose = 1 # 1 prints every trial, 2 also prints every boosting round
 OPT_niter = 10
 
 def get_fixed_params():
@@ -60,14 +71,234 @@ def get_param_space():
     
     return param_space
     
+class TuningData:
+    '''
+    Training data prepared once per tuning session and shared by all trials.
+    
+    Holds the DMatrix and the (train, validation) DMatrix slices of every cv fold,
+    so a trial only pays for boosting. With quantize=True the folds are stored as
+    histogram-quantized QuantileDMatrix copies and trials use tree_method 'hist'.
+    xgboost before 1.7 (e.g. the pinned 0.90) has no QuantileDMatrix, the folds are
+    then plain DMatrix slices that 'hist' quantizes in every trial.
+    '''
+    maximize_metrics = ('auc', 'aucpr', 'map', 'ndcg')
+    
+    def __init__(self, X, y, cv, quantize=False, max_bin=256):
+        '''
+        Args:
+            X, y (numpy array): training data
+            cv (object): an sklearn cv fold generator or a list of (train, validation) index pairs
+            quantize (bool): store histogram-quantized copies of the folds
+            max_bin (int): number of histogram bins when quantize=True
+        '''
+        self.fold_idx = list(cv.split(X=X, y=y)) if hasattr(cv, 'split') else list(cv)
+        self.quantize = quantize
+        self.max_bin = max_bin
+        
+        if quantize and hasattr(xgb, 'QuantileDMatrix'):
+            self.Xy = None
+            X, y = np.asarray(X), np.asarray(y)
+            self.folds = []
+            for train_idx, valid_idx in self.fold_idx:
+                dtrain = xgb.QuantileDMatrix(X[train_idx], label=y[train_idx], max_bin=max_bin)
+                dvalid = xgb.QuantileDMatrix(X[valid_idx], label=y[valid_idx], ref=dtrain)
+                self.folds.append((dtrain, dvalid))
+        else:
+            self.Xy = xgb.DMatrix(data=X, label=y)
+            self.folds = [(self.Xy.slice(train_idx), self.Xy.slice(valid_idx)) 
+                          for train_idx, valid_idx in self.fold_idx]
+    
+    def start_cv(self, params, metrics=()):
+        '''
+        Start a cross validation on the prepared folds that can be advanced in steps.
+        Args:
+            params (dict): booster parameters
+            metrics (list): evaluation metrics, replace params['eval_metric'] if given
+        Returns:
+            a CVRun
+        '''
+        return CVRun(self, params, metrics)
+    
+    def cv(self, params, num_boost_round, early_stopping_rounds=None, metrics=(), verbose_eval=False):
+        '''
+        Cross validate on the prepared folds, same output as xgb.cv.
+        Args:
+            params (dict): booster parameters
+            num_boost_round (int): maximum number of boosting rounds
+            early_stopping_rounds (int): stop when the last test metric did not improve for this many rounds
+            metrics (list): evaluation metrics, replace params['eval_metric'] if given
+            verbose_eval (bool): print the metrics of every round
+        Returns:
+            a DataFrame with the mean and std of every metric per round
+        '''
+        return self.start_cv(params, metrics).run(num_boost_round, early_stopping_rounds, verbose_eval)
+
+
+class CVRun:
+    '''
+    The fold boosters of one cross validation, kept so boosting can resume
+    where the last call to run() stopped.
+    '''
+    def __init__(self, data, params, metrics=()):
+        '''
+        Args:
+            data (TuningData): prepared training data and cv folds
+            params (dict): booster parameters
+            metrics (list): evaluation metrics, replace params['eval_metric'] if given
+        '''
+        params = dict(params)
+        metrics = list(metrics) or params.get('eval_metric', [])
+        metrics = [metrics] if isinstance(metrics, str) else metrics
+        params.pop('eval_metric', None)
+        if data.quantize:
+            params['tree_method'] = 'hist'
+            params['max_bin'] = data.max_bin
+        params_list = list(params.items()) + [('eval_metric', m) for m in metrics]
+        
+        self.folds = data.folds
+        self.boosters = [xgb.Booster(params_list, [dtrain, dvalid]) for dtrain, dvalid in self.folds]
+        self.results = {}
+        self.n_rounds = 0
+        self.stopped = False
+        self.best_score, self.best_iteration = None, 0
+    
+    def run(self, num_boost_round, early_stopping_rounds=None, verbose_eval=False):
+        '''
+        Boost until num_boost_round rounds in total or until early stopping.
+        Args:
+            num_boost_round (int): total number of boosting rounds to reach
+            early_stopping_rounds (int): stop when the last test metric did not improve for this many rounds
+            verbose_eval (bool): print the metrics of every round
+        Returns:
+            a DataFrame with the mean and std of every metric per round so far, same as xgb.cv
+        '''
+        for i in range(self.n_rounds, num_boost_round):
+            if self.stopped:
+                break
+            fold_scores = []
+            for bst, (dtrain, dvalid) in zip(self.boosters, self.folds):
+                bst.update(dtrain, i)
+                msg = bst.eval_set([(dtrain, 'train'), (dvalid, 'test')], i)
+                fold_scores.append([item.split(':') for item in msg.split('\t')[1:]])
+            self.n_rounds = i + 1
+            
+            names = [name for name, _ in fold_scores[0]]
+            values = np.array([[float(value) for _, value in scores] for scores in fold_scores])
+            for name, mean, std in zip(names, values.mean(axis=0), values.std(axis=0)):
+                self.results.setdefault(name + '-mean', []).append(mean)
+                self.results.setdefault(name + '-std', []).append(std)
+            if verbose_eval:
+                print('[%d]\t%s' % (i, '\t'.join('%s:%.5f+%.5f' % (name, mean, std) 
+                                                 for name, mean, std in zip(names, values.mean(axis=0), values.std(axis=0)))))
+            
+            # early stopping on the mean of the last test metric
+            if early_stopping_rounds:
+                score = values.mean(axis=0)[-1]
+                maximize = names[-1].split('-', 1)[1].startswith(TuningData.maximize_metrics)
+                if self.best_score is None or (score > self.best_score if maximize else score < self.best_score):
+                    self.best_score, self.best_iteration = score, i
+                elif i - self.best_iteration >= early_stopping_rounds:
+                    self.results = {k: v[:self.best_iteration + 1] for k, v in self.results.items()}
+                    self.stopped = True
+        
+        return pd.DataFrame.from_dict(self.results)
+
+
+def get_trial_params(params, nthread=None):
+    '''
+    Booster parameters of one trial: the fixed parameters updated with sampled values.
+    Args:
+        params (dict): a set of hyper-parameter values sampled from param_space
+        nthread (int): number of xgboost threads, all cores if None
+    '''
+    # set up booster parameters
+    params_bst = get_fixed_params()
+    params_bst.update(params)
+    params_bst['max_depth'] = int(params_bst['max_depth'])
+    if nthread is not None:
+        params_bst['nthread'] = nthread
+    
+    return params_bst
+
+
+def get_cv_score(cv_result):
+    '''
+    Args:
+        cv_result (DataFrame): output of xgb.cv or TuningData.cv
+    Returns:
+        the validation mean of the last evaluation metric at the last round
+    '''
+    # column order differs between xgboost versions, select the test metric by name
+    column = 'test-%s-mean' % evaluation_metrics[-1]
+    if column not in cv_result:
+        column = [c for c in cv_result.columns if c.startswith('test-') and c.endswith('-mean')][-1]
+    return cv_result[column].iloc[-1]
+
+
+def get_trial_result(cv_result, params_bst):
+    '''
+    Turn a cv result into the dictionary returned to hyperopt.
+    Args:
+        cv_result (DataFrame): output of xgb.cv or TuningData.cv
+        params_bst (dict): booster parameters of the trial
+    Returns:
+        a dictionary with keys 'loss', 'num_bst_round', 'status' and 'pruned', False for a completed trial
+    '''
+    avg_cv_score = get_cv_score(cv_result)
+    num_bst_round = cv_result.shape[0]
+    
+    if verbose == 1:
+        print('hyper-parameter values in this trial:')
+        print('max_depth        = %d' % params_bst['max_depth'])
+        print('min_child_weight = %.4f' % params_bst['min_child_weight'])
+        print('scale_pos_weight = %.4f' % params_bst['scale_pos_weight'])
+        print('subsample        = %.4f' % params_bst['subsample'])
+        print('colsample_bytree = %.4f' % params_bst['colsample_bytree'])
+        print('lambda           = %.6f' % params_bst['lambda'])
+        print('gamma            = %.6f' % params_bst['gamma'])
+        print('cv tuning score = %.8f, n_round = %d' % (avg_cv_score, num_bst_round))
+        print('')
+        
+    return {'loss'         : -avg_cv_score, 
+            'num_bst_round': num_bst_round,
+            'status'       : STATUS_OK,
+            'pruned'       : False}
+
+
+def cv_xgb_params(params, data, nthread=None):
+    '''
+    Cross validate one set of hyper-parameter values.
+    Args:
+        params (dict): a set of hyper-parameter values sampled from param_space
+        data (TuningData): training data and cv folds prepared for the tuning session
+        nthread (int): number of xgboost threads, all cores if None
+    Returns:
+        a dictionary with keys 'loss', 'num_bst_round' and 'status'
+    '''
+    params_bst = get_trial_params(params, nthread)
+    
+    # cross validation
+    cv_result = data.cv(params = params_bst,
+                        num_boost_round = XGB_bst_rounds,
+                        early_stopping_rounds = XGB_early_stop_rounds,
+                        metrics = evaluation_metrics,
+                        verbose_eval = verbose > 1)
+    
+    return get_trial_result(cv_result, params_bst)
+
 # create nested function closure        
-def generate_obj_func(X, y, cv,):
+def generate_obj_func(X, y, cv, quantize=False, store=None):
     '''
     Returns a closure obj_xgb.
     Args:
         X, y (numpy array): training data
         cv (object): an sklearn cv fold generator
+        quantize (bool): tune on histogram-quantized folds, see TuningData
+        store (TrialStore): answer parameter sets evaluated before from this store
     '''
+    # build the DMatrix and cv folds once for all trials
+    data = TuningData(X, y, cv, quantize=quantize)
+    
     def obj_xgb(params):
         '''
         Objective function to be minimized by hyperopt.fmin.
@@ -76,65 +307,322 @@ def generate_obj_func(X, y, cv,):
         Returns:
             a dictionary with keys 'loss', 'num_bst_round' and 'status'
         '''
-        # set up booster parameters
-        params_bst = get_fixed_params()
-        params_bst.update(params)
-        params_bst['max_depth'] = int(params_bst['max_depth'])
-        
-        # split cv folds
-        fold_idx = list(cv.split(X=X, y=y))
+        result = store.lookup(params) if store is not None else None
+        if result is None:
+            result = cv_xgb_params(params, data)
+            if store is not None:
+                store.remember(params, result)
+        return result
+    
+    return obj_xgb
+
+class TrialStore:
+    '''
+    Tuning history persisted in a local directory.
+    
+    The trials of a search are pickled under a key made of the dataset fingerprint,
+    the training configuration and the hyper-parameter space, so an interrupted
+    search resumes from the stored trials. Completed trial results are also kept
+    per dataset fingerprint, so a parameter set evaluated before is answered from
+    the store instead of being cross validated again, even after the space changed.
+    '''
+    
+    def __init__(self, trials_dir, X, y, cv, quantize=False, pruning=False):
+        '''
+        Args:
+            trials_dir (str): directory of the stored histories, created if missing
+            X, y (numpy array): training data
+            cv (object): an sklearn cv fold generator or a list of (train, validation) index pairs
+            quantize (bool): tuning on histogram-quantized folds, see TuningData
+            pruning (bool): the search prunes trials, see successive_halving_fmin. Pruned and
+                non-pruned searches keep separate trials, completed results are shared.
+        '''
+        os.makedirs(trials_dir, exist_ok=True)
+        fold_idx = list(cv.split(X=X, y=y)) if hasattr(cv, 'split') else list(cv)
         
-        # format training data
-        Xy = xgb.DMatrix(data=X, label=y)
+        # dataset, folds and everything else that changes a trial result
+        digest = hashlib.blake2b(digest_size=16)
+        for arr in [np.asarray(X), np.asarray(y)] + [idx for fold in fold_idx for idx in fold]:
+            arr = np.ascontiguousarray(arr)
+            digest.update(repr((arr.shape, arr.dtype.str)).encode())
+            digest.update(arr.tobytes())
+        digest.update(repr((sorted(get_fixed_params().items()), XGB_bst_rounds, XGB_early_stop_rounds,
+                            evaluation_metrics, quantize)).encode())
+        self.data_key = digest.hexdigest()
         
-        # cross validation
-        cv_result = xgb.cv(params = params_bst,
-                           dtrain = Xy,
-                           num_boost_round = XGB_bst_rounds,
-                           early_stopping_rounds = XGB_early_stop_rounds,
-                           folds = fold_idx, # nfold, stratified, seed, shuffle                               
-                           metrics = evaluation_metrics,
-                           fpreproc = None,
-                           verbose_eval = True)
-        avg_cv_score = cv_result.iloc[-1, 0]
-        num_bst_round = cv_result.shape[0]
+        digest.update(str(pyll.as_apply(get_param_space())).encode())
+        digest.update(repr(('pruning', pruning)).encode())
+        self.key = digest.hexdigest()
         
+        self.trials_path = os.path.join(trials_dir, '%s-trials.pkl' % self.key)
+        self.results_path = os.path.join(trials_dir, '%s-results.pkl' % self.data_key)
+        self.results = self._load(self.results_path, {})
+    
+    @staticmethod
+    def _load(path, default):
+        if not os.path.exists(path):
+            return default
+        try:
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError) as e:
+            print('could not read %s, starting over: %s' % (path, e))
+            return default
+    
+    @staticmethod
+    def _dump(path, obj):
+        # write to a temporary file first so an interrupted save keeps the previous copy
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(obj, f)
+        os.replace(tmp_path, path)
+    
+    @staticmethod
+    def get_params_key(params):
+        return tuple(sorted((name, float(value)) for name, value in params.items()))
+    
+    def load_trials(self):
+        '''
+        Returns:
+            the stored hyperopt Trials of this search, empty if there are none
+        '''
+        trls = self._load(self.trials_path, None)
+        if trls is None:
+            return Trials()
         if verbose == 1:
-            print('hyper-parameter values in this trial:')
-            print('max_depth        = %d' % params_bst['max_depth'])
-            print('min_child_weight = %.4f' % params_bst['min_child_weight'])
-            print('scale_pos_weight = %.4f' % params_bst['scale_pos_weight'])
-            print('subsample        = %.4f' % params_bst['subsample'])
-            print('colsample_bytree = %.4f' % params_bst['colsample_bytree'])
-            print('lambda           = %.6f' % params_bst['lambda'])
-            print('gamma            = %.6f' % params_bst['gamma'])
-            print('cv tuning score = %.8f, n_round = %d' % (avg_cv_score, num_bst_round))
-            print('')
+            print('resuming from %d stored trials in %s' % (len(trls.trials), self.trials_path))
+        return trls
+    
+    def save_trials(self, trls):
+        '''
+        Store the trials and remember the results of the completed ones.
+        Args:
+            trls (Trials): the trials of this search
+        '''
+        self._dump(self.trials_path, trls)
+        for trial in trls.trials:
+            if trial['result'].get('status') == STATUS_OK and not trial['result'].get('pruned', False):
+                params = {k: v[0] for k, v in trial['misc']['vals'].items() if v}
+                self.results.setdefault(self.get_params_key(params), trial['result'])
+        self._dump(self.results_path, self.results)
+    
+    def lookup(self, params):
+        '''
+        Args:
+            params (dict): a set of hyper-parameter values sampled from param_space
+        Returns:
+            a copy of the stored result of params, None if it was never evaluated
+        '''
+        result = self.results.get(self.get_params_key(params))
+        if result is None:
+            return None
+        # results stored before the 'pruned' flag existed are completed trials
+        return dict(result, pruned=result.get('pruned', False))
+    
+    def remember(self, params, result):
+        '''
+        Store the result of one evaluated set of hyper-parameter values.
+        Args:
+            params (dict): a set of hyper-parameter values sampled from param_space
+            result (dict): its cv result
+        '''
+        self.results[self.get_params_key(params)] = result
+        self._dump(self.results_path, self.results)
+
+
+# data shared by the trials run in one worker process
+_worker_data = {}
+# module level variables copied to worker processes
+_worker_config_names = ['XGB_eta', 'XGB_seed_bst', 'XGB_bst_rounds', 'XGB_early_stop_rounds', 'evaluation_metrics', 'verbose']
+
+def _init_trial_worker(X, y, cv, quantize, nthread, config):
+    globals().update(config)
+    _worker_data['data'] = TuningData(X, y, cv, quantize=quantize)
+    _worker_data['nthread'] = nthread
+
+def _run_trial(params):
+    return cv_xgb_params(params, _worker_data['data'], nthread=_worker_data['nthread'])
+
+
+def _suggest_trials(method, domain, trls, rstate, n_new):
+    # ask `method` for n_new proposals given the finished trials
+    new_ids = trls.new_trial_ids(n_new)
+    trls.refresh()
+    new_trials = method(new_ids, domain, trls, rstate.integers(2 ** 31 - 1))
+    
+    # hyper-parameter values of each proposal, as fmin would pass them to obj_xgb
+    new_params = [space_eval(domain.expr, {k: v[0] for k, v in trial['misc']['vals'].items() if v})
+                  for trial in new_trials]
+    return new_trials, new_params
+
+def _record_trials(trls, new_trials, results):
+    # add evaluated proposals to the trials
+    for trial, result in zip(new_trials, results):
+        trial['state'] = base.JOB_STATE_DONE
+        trial['result'] = result
+    
+    trls.insert_trial_docs(new_trials)
+    trls.refresh()
+
+
+def parallel_fmin(X, y, cv, method, max_evals, n_workers, seed=None, quantize=False, store=None):
+    '''
+    Run hyperopt trials n_workers at a time in a local process pool.
+    
+    Each round asks `method` for n_workers proposals given all finished trials,
+    evaluates them concurrently and adds the results before the next round.
+    The cores are split between the workers' xgboost threads.
+    Args:
+        X, y (numpy array): training data
+        cv (object): an sklearn cv fold generator
+        method (function): hyperopt suggest algorithm, e.g. tpe.suggest
+        max_evals (int): total number of trials
+        n_workers (int): number of trials evaluated at once
+        seed (int): seed of the proposal random state
+        quantize (bool): tune on histogram-quantized folds, see TuningData
+        store (TrialStore): resume from and save to this store
+    Returns:
+        a hyperopt Trials object holding all evaluated trials
+    '''
+    domain = base.Domain(cv_xgb_params, get_param_space())
+    trls = store.load_trials() if store is not None else Trials()
+    rstate = np.random.default_rng(seed)
+    
+    nthread = max(1, (os.cpu_count() or 1) // n_workers)
+    
+    with ProcessPoolExecutor(max_workers=n_workers,
+                             mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_trial_worker,
+                             initargs=(X, y, list(cv.split(X=X, y=y)), quantize, nthread,
+                                       {name: globals()[name] for name in _worker_config_names})) as executor:
+        while len(trls.trials) < max_evals:
+            n_new = min(n_workers, max_evals - len(trls.trials))
+            new_trials, new_params = _suggest_trials(method, domain, trls, rstate, n_new)
+            results = [store.lookup(params) if store is not None else None for params in new_params]
+            
+            # evaluate the parameter sets that are not in the store
+            todo = [i for i, result in enumerate(results) if result is None]
+            for i, result in zip(todo, executor.map(_run_trial, [new_params[i] for i in todo])):
+                results[i] = result
             
-        return {'loss'         : -avg_cv_score, 
-                'num_bst_round': num_bst_round,
-                'status'       : STATUS_OK}
+            _record_trials(trls, new_trials, results)
+            if store is not None:
+                store.save_trials(trls)
     
-    return obj_xgb
+    return trls
+
+
+def successive_halving_fmin(X, y, cv, method, max_evals, min_rounds=50, reduction_factor=3, seed=None, quantize=False, store=None):
+    '''
+    Run hyperopt trials in successive halving brackets with early pruning.
     
+    Each bracket asks `method` for a batch of proposals and boosts all of them to
+    min_rounds. Only the best 1/reduction_factor continue to min_rounds * reduction_factor
+    rounds, and so on up to XGB_bst_rounds. Boosting resumes where the previous budget
+    stopped. Pruned trials keep the loss reached at their last budget and have
+    'pruned' = True in their result.
+    Args:
+        X, y (numpy array): training data
+        cv (object): an sklearn cv fold generator
+        method (function): hyperopt suggest algorithm, e.g. tpe.suggest
+        max_evals (int): total number of trials
+        min_rounds (int): round budget of the first rung
+        reduction_factor (int): fraction of trials kept at each rung is 1/reduction_factor
+        seed (int): seed of the proposal random state
+        quantize (bool): tune on histogram-quantized folds, see TuningData
+        store (TrialStore): resume from and save to this store
+    Returns:
+        a hyperopt Trials object holding all evaluated trials
+    '''
+    domain = base.Domain(cv_xgb_params, get_param_space())
+    trls = store.load_trials() if store is not None else Trials()
+    rstate = np.random.default_rng(seed)
+    data = TuningData(X, y, cv, quantize=quantize)
+    
+    # round budgets of the rungs
+    budgets = [min(min_rounds, XGB_bst_rounds)]
+    while budgets[-1] < XGB_bst_rounds:
+        budgets.append(min(budgets[-1] * reduction_factor, XGB_bst_rounds))
+    bracket_size = reduction_factor ** (len(budgets) - 1)
+    
+    while len(trls.trials) < max_evals:
+        n_new = min(bracket_size, max_evals - len(trls.trials))
+        new_trials, new_params = _suggest_trials(method, domain, trls, rstate, n_new)
+        params_bst = [get_trial_params(params) for params in new_params]
+        runs = [data.start_cv(params, evaluation_metrics) for params in params_bst]
+        results = [store.lookup(params) if store is not None else None for params in new_params]
+        
+        # parameter sets completed before are not run again
+        alive = [i for i, result in enumerate(results) if result is None]
+        for rung, budget in enumerate(budgets):
+            cv_results = {i: runs[i].run(budget, XGB_early_stop_rounds, verbose_eval=verbose > 1) for i in alive}
+            ranked = sorted(alive, key=lambda i: -get_cv_score(cv_results[i]))
+            n_keep = len(alive) if rung == len(budgets) - 1 else max(1, len(alive) // reduction_factor)
+            
+            for i in ranked[n_keep:]:
+                results[i] = get_trial_result(cv_results[i], params_bst[i])
+                results[i]['pruned'] = True
+            if rung == len(budgets) - 1:
+                for i in ranked:
+                    results[i] = get_trial_result(cv_results[i], params_bst[i])
+            alive = ranked[:n_keep]
+        
+        _record_trials(trls, new_trials, results)
+        if store is not None:
+            store.save_trials(trls)
+        if verbose == 1:
+            print('bracket of %d trials done, %d pruned' % (n_new, sum(r.get('pruned', False) for r in results)))
+    
+    return trls
 
-def xgb_param_opt(X, y, cv, method):
+
+def xgb_param_opt(X, y, cv, method, n_workers=1, quantize=False, pruning=False, min_rounds=50, reduction_factor=3,
+                  trials_dir=None):
+    '''
+    Tune xgb hyper-parameters with hyperopt.
+    Args:
+        X, y (numpy array): training data
+        cv (object): an sklearn cv fold generator
+        method (function): hyperopt suggest algorithm, e.g. tpe.suggest
+        n_workers (int): number of trials evaluated at once in a process pool
+        quantize (bool): tune on histogram-quantized folds, see TuningData
+        pruning (bool): prune losing trials early with successive_halving_fmin, runs serially
+        min_rounds (int): first round budget when pruning
+        reduction_factor (int): 1/reduction_factor of the trials survive each budget when pruning
+        trials_dir (str): persist the trials here and resume from them, see TrialStore
+    Returns:
+        best_pars (dict) and best_score (float)
+    '''
+    if pruning and n_workers > 1:
+        raise ValueError('pruning runs its brackets serially, use n_workers=1 with pruning=True')
+    store = TrialStore(trials_dir, X, y, cv, quantize=quantize, pruning=pruning) if trials_dir else None
     
-    obj_func = generate_obj_func(X=X, y=y, cv=cv)
-    par_space = get_param_space()
     
     # minimize obj_func in par_space
     # best_pars contains best parameters selected from par_space
     # trls contains info from each trial of parameter search        
-    trls = Trials()
-    best_pars = fmin(obj_func, 
-                     par_space, 
-                     algo = method, #tpe.suggest, rand.suggest
-                     max_evals = OPT_niter,
-                     trials = trls)   
+    if pruning:
+        trls = successive_halving_fmin(X, y, cv, method, max_evals=OPT_niter, min_rounds=min_rounds,
+                                       reduction_factor=reduction_factor, quantize=quantize, store=store)
+    elif n_workers > 1:
+        trls = parallel_fmin(X, y, cv, method, max_evals=OPT_niter, n_workers=n_workers, quantize=quantize,
+                             store=store)
+    else:
+        obj_func = generate_obj_func(X=X, y=y, cv=cv, quantize=quantize, store=store)
+        par_space = get_param_space()
+        trls = store.load_trials() if store is not None else Trials()
+        fmin(obj_func, 
+             par_space, 
+             algo = method, #tpe.suggest, rand.suggest
+             max_evals = OPT_niter,
+             trials = trls,
+             trials_save_file = store.trials_path if store is not None else '')   
     res = pd.DataFrame([trial['result'] for trial in trls.trials]) # res = pd.DataFrame(trls.results)
-    best_score = -(res['loss'].min())
-    best_idx = res['loss'].idxmin()
+    # pruned trials stopped short of the full budget and are not candidates
+    completed = res[~res['pruned'].fillna(False).astype(bool)] if 'pruned' in res else res
+    best_score = -(completed['loss'].min())
+    best_idx = completed['loss'].idxmin()
+    best_pars = {k: v[0] for k, v in trls.trials[best_idx]['misc']['vals'].items() if v}
     best_pars['num_boost_round'] = res.loc[best_idx, 'num_bst_round']
     best_pars['max_depth'] = int(best_pars['max_depth'])
     best_pars.update(get_fixed_params())
@@ -170,13 +658,17 @@ def xgb_fit_predict(pars, Xtrain, ytrain, Xtest):
     return y_pred, bst
 
 
-def xgb_pipeline(Xtrain, ytrain, Xtest, cv, opt_method=tpe.suggest):#=rand.suggest
+@traced('xgb_pipeline')
+def xgb_pipeline(Xtrain, ytrain, Xtest, cv, opt_method=tpe.suggest, n_workers=1, pruning=False, trials_dir=None):#=rand.suggest
     
     # tune
     best_params, best_score = xgb_param_opt(X = Xtrain, 
                                             y = ytrain, 
                                             cv = cv, 
-                                            method = opt_method
+                                            method = opt_method,
+                                            n_workers = n_workers,
+                                            pruning = pruning,
+                                            trials_dir = trials_dir
                                             )
     # fit and predict
     y_pred, bst = xgb_fit_predict(pars = best_params,
@@ -1,8 +1,11 @@
 from .featureengineering import clean_dataset
+from .featureengineering import optimize_dtypes
 from .featureengineering import create_features_df_features
 from .featureengineering import create_features_df_donations
+from .featureengineering import assign_donation_windows
+from .featureengineering import create_features_df_donations_multi
 
 from .preprocess_traintestsplit import feature_target_split
 from .preprocess_traintestsplit import train_test_stratifysplit
 
-__all__ = ['clean_dataset', 'create_features_df_features', 'create_features_df_donations','feature_target_split', 'train_test_stratifysplit']
\ No newline at end of file
+__all__ = ['clean_dataset', 'optimize_dtypes', 'create_features_df_features', 'create_features_df_donations', 'assign_donation_windows', 'create_features_df_donations_multi','feature_target_split', 'train_test_stratifysplit']
\ No newline at end of file
@@ -14,7 +14,66 @@ def clean_dataset(df):
 
     return df.reset_index(drop=True)
 
-def create_features_df_features(df, ind_features=['totalHouseholdDebt','primaryPropertyLoanToValue','primaryPropertyValue', 'propertyCount', 'NetWorth'], ID='candidate_id'):
+def optimize_dtypes(df, id_columns=None, max_category_ratio=0.5, exact_floats=True):
+    '''
+    downcast a dataframe to the smallest safe dtypes.
+    
+    integers get the smallest signed width holding their range, so counts can still be
+    incremented or differenced. floats become float32 only when the round trip is exact,
+    unless exact_floats is False, then any float that fits in float32 is downcast (the
+    precision xgboost trains on). strings with few distinct values become categoricals.
+    ID columns are left as they are, so merges and groupbys on them keep their semantics,
+    e.g. a groupby on a categorical would also list the unobserved candidates.
+    
+    Args:
+        df (dataframe)
+        id_columns (list): columns left as they are. None for the columns named id or
+            ending in _id, e.g. candidate_id and cand_id.
+        max_category_ratio (float): strings become categoricals when they have at most
+            this fraction of distinct values.
+        exact_floats (bool): only downcast float columns without loss.
+    Returns:
+        a dataframe with compact dtypes and a dictionary of the bytes before and after
+        and the columns changed.
+    '''
+    if id_columns is None:
+        id_columns = [col for col in df.columns if str(col) == 'id' or str(col).endswith('_id')]
+    
+    bytes_before = int(df.memory_usage(deep=True).sum())
+    columns = {}
+    
+    for col in df.columns:
+        s = df[col]
+        if col in id_columns or pd.api.types.is_bool_dtype(s) or isinstance(s.dtype, pd.CategoricalDtype):
+            continue
+        if pd.api.types.is_integer_dtype(s):
+            downcast = pd.to_numeric(s, downcast='integer')
+            if downcast.dtype != s.dtype:
+                columns[col] = downcast
+        elif pd.api.types.is_float_dtype(s):
+            values = s.to_numpy()
+            with np.errstate(over='ignore'):
+                values32 = values.astype(np.float32)
+            finite = np.isfinite(values)
+            if exact_floats:
+                safe = np.array_equal(values32[finite], values[finite])
+            else:
+                safe = np.isfinite(values32[finite]).all()
+            if safe and s.dtype != np.float32:
+                columns[col] = pd.Series(values32, index=s.index)
+        elif pd.api.types.is_object_dtype(s) or pd.api.types.is_string_dtype(s):
+            if s.nunique() <= max_category_ratio * len(s):
+                columns[col] = s.astype('category')
+    
+    if columns:
+        df = df.assign(**columns)
+    
+    bytes_after = int(df.memory_usage(deep=True).sum())
+    print('optimize_dtypes: %.1f MB -> %.1f MB, %d columns changed' % (bytes_before / 1e6, bytes_after / 1e6, len(columns)))
+    
+    return df, {'bytes_before': bytes_before, 'bytes_after': bytes_after, 'columns_changed': list(columns)}
+
+def create_features_df_features(df, ind_features=['totalHouseholdDebt','primaryPropertyLoanToValue','primaryPropertyValue', 'propertyCount', 'NetWorth'], ID='candidate_id', optimize=True):
     '''
     create features off of df_features dataset.
     
@@ -22,6 +81,7 @@ def create_features_df_features(df, ind_features=['totalHouseholdDebt','primaryP
         df (dataframe):  df_features.csv
         ind_features (list) = ['totalHouseholdDebt', 'primaryPropertyLoanToValue','primaryPropertyValue', 'propertyCount', 'NetWorth']
         ID (str) = 'candidate_id'
+        optimize (bool): downcast the result with optimize_dtypes.
     Returns:
         a dataframe with added features used for modeling.
     ''' 
@@ -47,62 +107,151 @@ def create_features_df_features(df, ind_features=['totalHouseholdDebt','primaryP
     
     df.drop(columns=['totalHouseholdDebt','primaryPropertyLoanToValue'], axis=1, inplace=True)
     
+    if optimize:
+        df, _ = optimize_dtypes(df, id_columns=[ID])
+    
     return df
 
 
-def create_features_df_donations(df, PredictedOn='2016-08-01'):
+# 360 day windows prior to PredictedOn used for donation features.
+# each window is (name, lower, upper) and holds lower <= DaysFromPrediction < upper.
+DONATION_WINDOWS = [('prev360d2', -720, -360),
+                    ('prev360d3', -1080, -720),
+                    ('prev360d4', -1440, -1080),
+                    ('prev360d5', -1800, -1440)]
+
+def assign_donation_windows(days, windows=DONATION_WINDOWS):
+    '''
+    assign each donation to a window in one vectorized pass.
+    
+    Args:
+        days (array): DaysFromPrediction of each donation
+        windows (list): non-overlapping (name, lower, upper) windows, see DONATION_WINDOWS
+    Returns:
+        an int array with the position of the window in `windows` for each donation, -1 if it falls in none.
+    '''
+    days = np.asarray(days)
+    lower = np.array([w[1] for w in windows])
+    upper = np.array([w[2] for w in windows])
+    order = np.argsort(lower, kind='stable')
+    lower, upper = lower[order], upper[order]
+    if np.any(lower >= upper) or np.any(upper[:-1] > lower[1:]):
+        raise ValueError('donation windows must be non-empty and non-overlapping: %r' % (windows,))
+    
+    # last window starting at or before each day, kept only if the day is before its upper edge
+    pos = np.searchsorted(lower, days, side='right') - 1
+    in_window = (pos >= 0) & (days < upper[np.maximum(pos, 0)])
+    
+    return np.where(in_window, order[np.maximum(pos, 0)], -1)
+
+
+def create_features_df_donations(df, PredictedOn='2016-08-01', windows=DONATION_WINDOWS):
     '''
     create features off of df_donations dataset.
     
     Args:
         df (dataframe):  df_donations.csv col = ['cand_id', 'trans_date', 'amount']
         PredictedOn (str format 'Y-m-d'): date of prediction
+        windows (list): (name, lower, upper) windows in days from PredictedOn, see DONATION_WINDOWS
     Returns:
         a dataframe with features used for modeling.
     ''' 
     df = clean_dataset(df)
+    df = df.set_axis(['candidate_id', 'trans_date', 'amount'], axis=1)
     
-    df.set_axis(['candidate_id', 'trans_date', 'amount'], axis=1, inplace=True)
-    df['trans_date'] = pd.to_datetime(df['trans_date']).copy()
+    days = (pd.to_datetime(df['trans_date']) - pd.Timestamp(PredictedOn)).dt.days.to_numpy()
+    window_idx = assign_donation_windows(days, windows)
     
-    samedatelist = [PredictedOn for x in range(df.shape[0])] 
-    df['DaysFromPrediction'] = (df['trans_date'] - pd.to_datetime(samedatelist)).dt.days
+    # count and amount per candidate and window with a single grouped reduction
+    cand_codes, cand_ids = pd.factorize(df['candidate_id'], sort=True)
+    n_windows = len(windows)
+    in_window = window_idx >= 0
+    cells = cand_codes[in_window] * n_windows + window_idx[in_window]
+    n_cells = len(cand_ids) * n_windows
+    amount = df['amount'].to_numpy()
+    counts = np.bincount(cells, minlength=n_cells).reshape(-1, n_windows)
+    amounts = np.bincount(cells, weights=amount[in_window], minlength=n_cells).reshape(-1, n_windows)
+    amounts = amounts.astype(np.result_type(amount.dtype, 0), copy=False)
     
-    # count times candidates have donated in last 1 years
-    #lmbdfx = lambda x: (1 if x < 0 and x >= -360 else 0)
-    #df['count_trans_date_prev360d1'] = df['DaysFromPrediction'].apply(lmbdfx)
-
-    # count times candidates have donated in last 2 years
-    lmbdfx = lambda x: (1 if x < -360 and x >= -720 else 0)
-    df['count_trans_date_prev360d2'] = df['DaysFromPrediction'].apply(lmbdfx)
-
-    # count times candidates have donated in last 3 years
-    lmbdfx = lambda x: (1 if x < -720 and x >= -1080 else 0)
-    df['count_trans_date_prev360d3'] = df['DaysFromPrediction'].apply(lmbdfx)
-
-    # count times candidates have donated in last 4 years
-    lmbdfx = lambda x: (1 if x < -1080 and x >= -1440 else 0)
-    df['count_trans_date_prev360d4'] = df['DaysFromPrediction'].apply(lmbdfx)
-
-    # count times candidates have donated in last 5+ years
-    lmbdfx = lambda x: (1 if x < -1440 and x >= -1800 else 0)
-    df['count_trans_date_prev360d5'] = df['DaysFromPrediction'].apply(lmbdfx)
+    df_addfeatures = pd.DataFrame(amounts, columns=['amount_%s' % w[0] for w in windows])
+    df_addfeatures.insert(0, 'candidate_id', cand_ids)
+    # cum prev 5 years
+    # the original iloc[:,1:6] column sum spanned the window counts and amount_prev360d2,
+    # kept as is so models trained on this feature see the same values.
+    df_addfeatures['count_trans_date_prev5y'] = counts.sum(axis=1) + amounts[:, 0]
+    
+    return df_addfeatures
 
-    # amount spent per year prior to prediction date. 0 >= post prediction date
-    #df['amount_prev360d1'] = pd.DataFrame(np.where(df['count_trans_date_prev360d1'] == 1, df['amount'], 0), columns=['amount_prev360d1'])
-    df['amount_prev360d2'] = pd.DataFrame(np.where(df['count_trans_date_prev360d2'] == 1, df['amount'], 0), columns=['amount_prev360d2'])
-    df['amount_prev360d3'] = pd.DataFrame(np.where(df['count_trans_date_prev360d3'] == 1, df['amount'], 0), columns=['amount_prev360d3'])
-    df['amount_prev360d4'] = pd.DataFrame(np.where(df['count_trans_date_prev360d4'] == 1, df['amount'], 0), columns=['amount_prev360d4'])
-    df['amount_prev360d5'] = pd.DataFrame(np.where(df['count_trans_date_prev360d5'] == 1, df['amount'], 0))
 
-    df_addfeatures = df.groupby('candidate_id').agg(sum).iloc[:, 2:].reset_index()
-    # cum prev 5 years
-    df_addfeatures['count_trans_date_prev5y'] = pd.DataFrame(df_addfeatures.iloc[:,1:6].sum(axis=1), columns=['count_trans_date_prev5y'])
-    #df_addfeatures['amount_prev5y'] = pd.DataFrame(df_addfeatures.iloc[:,6:11].sum(axis=1), columns=['amount_prev5y'])
-    # cum prev 2 years
-    #df_addfeatures['count_trans_date_prev2y'] = pd.DataFrame(df_addfeatures.iloc[:,1:3].sum(axis=1), columns=['count_trans_date_prev5y'])
-    #df_addfeatures['amount_prev2y'] = pd.DataFrame(df_addfeatures.iloc[:,6:8].sum(axis=1), columns=['amount_prev5y'])
+def create_features_df_donations_multi(df, PredictedOn_list, windows=DONATION_WINDOWS):
+    '''
+    create the create_features_df_donations features for several dates of prediction at once.
+    
+    Donations are sorted by candidate and date and summed into per-candidate cumulative
+    amounts once; each window total is then the difference of those cumulative amounts
+    at two edges found by binary search, so there is no re-scan per date.
+    Windows must end on or before the date of prediction so no later donation is used.
+    
+    Args:
+        df (dataframe):  df_donations.csv col = ['cand_id', 'trans_date', 'amount']
+        PredictedOn_list (list of str format 'Y-m-d'): dates of prediction
+        windows (list): (name, lower, upper) windows in days from PredictedOn, see DONATION_WINDOWS
+    Returns:
+        a dataframe with one row per (PredictedOn, candidate_id) and the same features as create_features_df_donations.
+    ''' 
+    if any(w[2] > 0 for w in windows):
+        raise ValueError('donation windows must end on or before PredictedOn: %r' % (windows,))
+    
+    df = clean_dataset(df)
+    df = df.set_axis(['candidate_id', 'trans_date', 'amount'], axis=1)
+    
+    # day number of each donation, floored like (trans_date - PredictedOn).dt.days
+    days = pd.to_datetime(df['trans_date']).to_numpy().astype('datetime64[D]').astype(np.int64)
+    cand_codes, cand_ids = pd.factorize(df['candidate_id'], sort=True)
+    amount = df['amount'].to_numpy()
+    
+    cutoffs = pd.to_datetime(pd.Series(PredictedOn_list)).to_numpy().astype('datetime64[D]').astype(np.int64)
+    edges = np.array([w[1] for w in windows] + [w[2] for w in windows])
+    
+    # sort once by (candidate, day) on a single int64 key; every day and window edge
+    # falls in [base, base + span) so a candidate's keys never reach the next candidate's.
+    base = days.min(initial=cutoffs.min() + edges.min())
+    span = days.max(initial=cutoffs.max() + edges.max()) - base + 1
+    keys = cand_codes.astype(np.int64) * span + (days - base)
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    # running total restarted at each candidate, one running total over all donations
+    # would lose the cents of small candidates once the total of all donations is large.
+    # cum_amount[i] is the amount of the candidate's donations before sorted position i.
+    cum_amount = (pd.Series(amount[order].astype(np.float64))
+                  .groupby(cand_codes[order]).cumsum().to_numpy())
+    cum_amount = np.concatenate([[0.0], cum_amount])
     
-    df_addfeatures.drop(columns=['count_trans_date_prev360d2','count_trans_date_prev360d3','count_trans_date_prev360d4','count_trans_date_prev360d5'], axis=1, inplace=True)
+    out_dtype = np.result_type(amount.dtype, 0)
+    cand_base = np.arange(len(cand_ids), dtype=np.int64) * span
+    # sorted position of each candidate's first donation
+    cand_start = np.searchsorted(keys, cand_base)[:, None]
+    # adjacent windows share an edge, each distinct edge is searched once
+    edge_days = np.unique(edges)
+    lower_idx = np.searchsorted(edge_days, [w[1] for w in windows])
+    upper_idx = np.searchsorted(edge_days, [w[2] for w in windows])
+    frames = []
+    for PredictedOn, cutoff in zip(PredictedOn_list, cutoffs):
+        # positions of the first donations on or after each edge, per candidate, from one
+        # search whose needles are sorted like the keys
+        needles = cand_base[:, None] + (cutoff + edge_days - base)
+        pos = np.searchsorted(keys, needles.ravel()).reshape(needles.shape)
+        # nothing before the candidate's first donation, the running total restarts there
+        cum_at_edge = np.where(pos > cand_start, cum_amount[pos], 0.0)
+        counts = pos[:, upper_idx] - pos[:, lower_idx]
+        amounts = cum_at_edge[:, upper_idx] - cum_at_edge[:, lower_idx]
+        amounts = amounts.astype(out_dtype, copy=False)
+        
+        df_addfeatures = pd.DataFrame(amounts, columns=['amount_%s' % w[0] for w in windows])
+        df_addfeatures.insert(0, 'candidate_id', cand_ids)
+        df_addfeatures.insert(0, 'PredictedOn', pd.Timestamp(PredictedOn))
+        # same definition as create_features_df_donations, including amount_prev360d2
+        df_addfeatures['count_trans_date_prev5y'] = counts.sum(axis=1) + amounts[:, 0]
+        frames.append(df_addfeatures)
     
-    return df_addfeatures
\ No newline at end of file
+    return pd.concat(frames, ignore_index=True)
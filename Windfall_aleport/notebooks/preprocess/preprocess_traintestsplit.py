@@ -7,6 +7,13 @@ import pandas as pd
 from sklearn.model_selection import train_test_split
 from sklearn.model_selection import StratifiedKFold
 
+# record calls in the run trace when the AuroraML instrumentation is importable
+try:
+    from instrumentation import traced
+except ImportError:
+    def traced(name=None, get_input=None):
+        return lambda func: func
+
 """
 feature_target_split(): function that seperates the target variable(s) from feature variables. Prints metadata about the full dataset.
 train_test_stratifysplit(): function that uses sklearn's train_test_split() to create stratified splits at a default of test size = 0.30 and random state kept constant. 
@@ -38,6 +45,7 @@ def feature_target_split(df, cnames_to_drop=['ideal_donor', 'candidate_id'], tar
     return X, y
 
 
+@traced('train_test_stratifysplit')
 def train_test_stratifysplit(df, cnames_to_drop, target_col, test_size=0.3, random_state=42):
     '''
     If the argument `test_size` isnt't passed in, the default 0.30 is used.
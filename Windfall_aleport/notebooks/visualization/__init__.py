@@ -1,5 +1,19 @@
+from .visualize import read_predictions
+from .visualize import get_pct_to_pick
+from .visualize import get_cumgains_lift
+from .visualize import get_lift_table
 from .visualize import plot_cumgains_lift
+from .visualize import render_cumgains_lift
 from .visualize import plot_aucroc_aucpr
+from .visualize import render_aucroc_aucpr
+from .visualize import get_threshold_sweep
+from .visualize import get_threshold_table
 from .visualize import get_confusion_matrix
+from .streaming_metrics import ScoreHistogram
+from .bootstrap import bootstrap_metrics
+from .bootstrap import bootstrap_file
+from .report import load_predictions_cached
+from .report import render_model_report
+from .report import batch_report
 
-__all__ = ['plot_aucroc_aucpr', 'get_confusion_matrix', 'plot_cumgains_lift']
\ No newline at end of file
+__all__ = ['read_predictions', 'get_pct_to_pick', 'get_cumgains_lift', 'get_lift_table', 'plot_aucroc_aucpr', 'render_aucroc_aucpr', 'get_threshold_sweep', 'get_threshold_table', 'get_confusion_matrix', 'plot_cumgains_lift', 'render_cumgains_lift', 'ScoreHistogram', 'bootstrap_metrics', 'bootstrap_file', 'load_predictions_cached', 'render_model_report', 'batch_report']
\ No newline at end of file
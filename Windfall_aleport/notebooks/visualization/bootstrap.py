@@ -0,0 +1,170 @@
+#----------------------------------------------------------------
+# import packages
+#----------------------------------------------------------------
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import numpy as np
+
+from .visualize import get_pct_to_pick, read_predictions
+
+#******************************************************************************
+# Bootstrap confidence intervals of auc and lift
+#******************************************************************************
+
+# sorted predictions shared by the batches run in one worker process
+_worker_data = {}
+
+def _sort_predictions(Ytrue, Ypred):
+    # sort once by descending Ypred, ties keep their order as in get_cumgains_lift
+    Ypred = np.asarray(Ypred)
+    order = np.argsort(-Ypred, kind='stable')
+    Ypred_sorted = Ypred[order]
+    y_sorted = (np.asarray(Ytrue)[order] == 1).astype(np.int64)
+
+    # first row of each run of equal scores
+    starts = np.flatnonzero(np.append(True, Ypred_sorted[1:] != Ypred_sorted[:-1]))
+
+    return y_sorted, starts
+
+def _replicate_metrics(W, y_sorted, starts, pct_to_pick):
+    '''
+    Metrics of many weighted copies of the sorted predictions at once.
+
+    Args:
+        W (array): one row of resample counts per replicate, in sorted order.
+        y_sorted (array): true labels in sorted order.
+        starts (array): first row of each run of equal scores.
+        pct_to_pick (array): fractions of the population the lift is computed at.
+    Returns:
+        roc_auc and pr_auc of each replicate, and lift of each replicate at each pct_to_pick.
+    '''
+    n_total = W.shape[1]
+    pos_w = W * y_sorted
+    neg_w = W - pos_w
+
+    # positives and negatives per distinct score, from the highest score down
+    pos_g = np.add.reduceat(pos_w, starts, axis=1)
+    neg_g = np.add.reduceat(neg_w, starts, axis=1)
+    tp = np.cumsum(pos_g, axis=1)
+    fp = np.cumsum(neg_g, axis=1)
+    P = tp[:, -1].astype(np.float64)
+    N = fp[:, -1].astype(np.float64)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # ties count half, as roc_auc_score
+        roc_auc = np.sum(neg_g * (tp - pos_g + 0.5 * pos_g), axis=1) / (P * N)
+
+        # precision at each distinct score as threshold, as average_precision_score
+        pr_auc = np.sum(pos_g * (tp / np.maximum(tp + fp, 1)), axis=1) / P
+
+        # true positives among the top k rows of each replicate
+        cum_w = np.cumsum(W, axis=1)
+        cum_tp = np.cumsum(pos_w, axis=1)
+        k_pick = np.minimum(np.ceil(pct_to_pick * n_total), n_total)
+        lift = np.empty((W.shape[0], len(pct_to_pick)))
+        for b in range(W.shape[0]):
+            r = np.searchsorted(cum_w[b], k_pick)
+            tp_k = cum_tp[b, r] - (cum_w[b, r] - k_pick) * y_sorted[r]
+            lift[b] = tp_k / P[b] / pct_to_pick
+
+    return roc_auc, pr_auc, lift
+
+def _init_bootstrap_worker(y_sorted, starts, pct_to_pick):
+    _worker_data['args'] = (y_sorted, starts, pct_to_pick)
+
+def _bootstrap_batch(batch):
+    seed, n_reps = batch
+    y_sorted, starts, pct_to_pick = _worker_data['args']
+    n = len(y_sorted)
+
+    # resample indices of all replicates in the batch, counted per row
+    rng = np.random.default_rng(seed)
+    idx = rng.integers(0, n, size=(n_reps, n)) + (np.arange(n_reps) * n)[:, None]
+    W = np.bincount(idx.ravel(), minlength=n_reps * n).reshape(n_reps, n)
+
+    return _replicate_metrics(W, y_sorted, starts, pct_to_pick)
+
+def bootstrap_metrics(Ytrue, Ypred, n_boot=1000, alpha=0.05, step=0.05, seed=0, n_workers=1, batch_size=None):
+    '''
+    Percentile bootstrap confidence intervals of roc-auc, pr-auc and lift.
+
+    The predictions are sorted once. A replicate is a vector of resample counts over the
+    sorted rows, so its metrics come from weighted cumulative sums without sorting again.
+    Replicates are drawn and evaluated batch_size at a time as 2-d arrays, and batches
+    are spread over a process pool. Every batch has its own seed spawned from `seed`,
+    so the intervals do not depend on n_workers.
+
+    Args:
+        Ytrue (array): true labels, 1 for positives.
+        Ypred (array): predicted scores.
+        n_boot (int): number of bootstrap replicates.
+        alpha (float): the intervals cover 1 - alpha.
+        step (float): fraction of the population added at each lift point, as in get_cumgains_lift.
+        seed (int): seed of the resampling.
+        n_workers (int): number of batches evaluated at once.
+        batch_size (int): replicates per batch, about 2e7 resampled rows per batch if None.
+    Returns:
+        a dataframe of roc_auc and pr_auc with their estimate, low and high bounds,
+        and a dataframe of pct_to_pick with the lift, lift_low and lift_high.
+    '''
+    y_sorted, starts = _sort_predictions(Ytrue, Ypred)
+    n = len(y_sorted)
+    pct_to_pick = get_pct_to_pick(step)
+
+    # point estimates on the sample itself
+    roc_auc, pr_auc, lift = _replicate_metrics(np.ones((1, n), dtype=np.int64), y_sorted, starts, pct_to_pick)
+
+    if batch_size is None:
+        batch_size = max(1, int(2e7 // n))
+    n_batches = -(-n_boot // batch_size)
+    seeds = np.random.SeedSequence(seed).spawn(n_batches)
+    batches = [(seeds[i], min(batch_size, n_boot - i * batch_size)) for i in range(n_batches)]
+
+    if n_workers > 1:
+        with ProcessPoolExecutor(max_workers=n_workers,
+                                 mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_bootstrap_worker,
+                                 initargs=(y_sorted, starts, pct_to_pick)) as executor:
+            results = list(executor.map(_bootstrap_batch, batches))
+    else:
+        _init_bootstrap_worker(y_sorted, starts, pct_to_pick)
+        results = [_bootstrap_batch(batch) for batch in batches]
+
+    boot_roc_auc, boot_pr_auc, boot_lift = (np.concatenate(r) for r in zip(*results))
+    q = [100 * alpha / 2, 100 * (1 - alpha / 2)]
+
+    auc_ci = pd.DataFrame({'estimate': [roc_auc[0], pr_auc[0]],
+                           'low'     : [np.nanpercentile(boot_roc_auc, q[0]), np.nanpercentile(boot_pr_auc, q[0])],
+                           'high'    : [np.nanpercentile(boot_roc_auc, q[1]), np.nanpercentile(boot_pr_auc, q[1])]},
+                          index=['roc_auc', 'pr_auc'])
+
+    lift_low, lift_high = np.nanpercentile(boot_lift, q, axis=0)
+    lift_ci = pd.DataFrame({'pct_to_pick': pct_to_pick,
+                            'lift'       : lift[0],
+                            'lift_low'   : lift_low,
+                            'lift_high'  : lift_high})
+
+    return auc_ci, lift_ci
+
+def bootstrap_file(file_name, **kwargs):
+    '''
+    Args:
+        file_name (str): name of df containing ID (str), Ytrue (int), Ypred (float).
+        kwargs: passed to bootstrap_metrics.
+    Returns:
+        the bootstrap_metrics intervals of the prediction file.
+    '''
+    df = read_predictions(file_name, columns=('Ytrue', 'Ypred'))
+
+    return bootstrap_metrics(df['Ytrue'].to_numpy(), df['Ypred'].to_numpy(), **kwargs)
+
+#******************************************************************************
+# Run the main script
+#******************************************************************************
+
+if __name__ == '__main__':
+    print("bootstrap.__name__ set to ", __name__ )
+else:
+    print('bootstrap mod is imported into another module')
@@ -0,0 +1,145 @@
+#----------------------------------------------------------------
+# import packages
+#----------------------------------------------------------------
+import os
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import numpy as np
+import matplotlib
+import matplotlib.pyplot as plt
+from sklearn.metrics import roc_auc_score, average_precision_score
+
+from .visualize import read_predictions, get_cumgains_lift, render_cumgains_lift, render_aucroc_aucpr
+
+#******************************************************************************
+# Batch reports of many models
+#******************************************************************************
+
+# number of prediction files kept in memory per process
+PREDICTION_CACHE_SIZE = 4
+
+@functools.lru_cache(maxsize=PREDICTION_CACHE_SIZE)
+def _read_predictions_cached(path, mtime_ns):
+    return read_predictions(path, columns=('Ytrue', 'Ypred'))
+
+def load_predictions_cached(file_name):
+    '''
+    Read a prediction file and reuse it until the file changes.
+
+    The last PREDICTION_CACHE_SIZE files read in the process are kept, older ones and
+    versions of a file that changed since are dropped.
+
+    Args:
+        file_name (str): name of df containing ID (str), Ytrue (int), Ypred (float).
+    Returns:
+        a dataframe with Ytrue and Ypred.
+    '''
+    return _read_predictions_cached(os.path.abspath(file_name), os.stat(file_name).st_mtime_ns)
+
+def _init_report_worker():
+    # render to files only
+    plt.switch_backend('Agg')
+
+def render_model_report(file_name, label, output_dir, thresh=0.50, image_format='png'):
+    '''
+    Write the gains/lift and auc roc/pr charts of one model and summarize its metrics.
+
+    Args:
+        file_name (str): name of df containing ID (str), Ytrue (int), Ypred (float).
+        label (str): name of the model, used in the legends and image file names.
+        output_dir (str): directory the images are written to.
+        thresh (float): value to classify all Ypred greater than threshold as 1 and lesser than threshold as 0.
+        image_format (str): image file format, e.g. 'png' or 'svg'.
+    Returns:
+        a dictionary of the model's metrics and image file names.
+    '''
+    df = load_predictions_cached(file_name)
+    Ytrue = df['Ytrue'].to_numpy()
+    Ypred = df['Ypred'].to_numpy()
+
+    pct_to_pick, tpr_decile, k_realPOS, k_total = get_cumgains_lift(Ytrue, Ypred)
+
+    gains_image = os.path.join(output_dir, '%s-cumgains_lift.%s' % (label, image_format))
+    fig = render_cumgains_lift(pct_to_pick, tpr_decile, label)
+    fig.savefig(gains_image, bbox_inches='tight')
+    plt.close(fig)
+
+    auc_image = os.path.join(output_dir, '%s-aucroc_aucpr.%s' % (label, image_format))
+    fig = render_aucroc_aucpr(Ytrue, Ypred)
+    fig.savefig(auc_image, bbox_inches='tight')
+    plt.close(fig)
+
+    # confusion matrix counts at thresh
+    predicted = Ypred > thresh
+    tp = int(np.sum(predicted & (Ytrue == 1)))
+    fp = int(np.sum(predicted & (Ytrue != 1)))
+
+    return {'model'             : label,
+            'file_name'         : file_name,
+            'k_total'           : k_total,
+            'k_realPOS'         : k_realPOS,
+            'roc_auc'           : roc_auc_score(Ytrue, Ypred),
+            'pr_auc'            : average_precision_score(Ytrue, Ypred),
+            'lift_10pct'        : tpr_decile[1] / pct_to_pick[1],
+            'lift_20pct'        : tpr_decile[3] / pct_to_pick[3],
+            'thresh'            : thresh,
+            'precision'         : tp / float(tp + fp) if tp + fp else np.nan,
+            'sensitivity'       : tp / float(k_realPOS) if k_realPOS else np.nan,
+            'cumgains_lift_image': gains_image,
+            'aucroc_aucpr_image': auc_image}
+
+def _render_model_report(args):
+    return render_model_report(*args)
+
+def batch_report(file_names, output_dir, labels=None, n_workers=1, thresh=0.50, image_format='png'):
+    '''
+    Render the charts of many models to image files, in parallel worker processes, and summarize them in a table.
+
+    Each prediction file is read once and all charts of its model are drawn from that copy
+    with the non-interactive Agg backend.
+
+    Args:
+        file_names (list): prediction files, one per model, see render_model_report.
+        output_dir (str): directory the images and summary.csv are written to, created if missing.
+        labels (list): model names, the file names without extension if None.
+        n_workers (int): number of models rendered at once.
+        thresh (float): threshold of the precision and sensitivity columns.
+        image_format (str): image file format, e.g. 'png' or 'svg'.
+    Returns:
+        a dataframe with one row of metrics and image file names per model.
+    '''
+    os.makedirs(output_dir, exist_ok=True)
+    if labels is None:
+        labels = [os.path.splitext(os.path.basename(file_name))[0] for file_name in file_names]
+    args = [(file_name, label, output_dir, thresh, image_format) for file_name, label in zip(file_names, labels)]
+
+    if n_workers > 1:
+        with ProcessPoolExecutor(max_workers=n_workers,
+                                 mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_report_worker) as executor:
+            rows = list(executor.map(_render_model_report, args))
+    else:
+        backend = matplotlib.get_backend()
+        _init_report_worker()
+        try:
+            rows = [_render_model_report(arg) for arg in args]
+        finally:
+            plt.switch_backend(backend)
+            _read_predictions_cached.cache_clear()
+
+    summary = pd.DataFrame(rows).set_index('model')
+    summary.to_csv(os.path.join(output_dir, 'summary.csv'))
+
+    return summary
+
+#******************************************************************************
+# Run the main script
+#******************************************************************************
+
+if __name__ == '__main__':
+    print("report.__name__ set to ", __name__ )
+else:
+    print('report mod is imported into another module')
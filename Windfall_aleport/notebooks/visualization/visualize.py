@@ -7,8 +7,6 @@ from numpy import sqrt
 from numpy import argmax
 from sklearn.metrics import roc_auc_score, roc_curve, auc, precision_recall_curve, average_precision_score, confusion_matrix
 
-import pickle
-
 import matplotlib.pyplot as plt 
 import matplotlib
 import seaborn as sns
@@ -20,43 +18,147 @@ sns.set(style="whitegrid", color_codes=True)
 # Plot gains and lift
 #******************************************************************************
 
-def plot_cumgains_lift(file_name, label, random=0.50, color='orange'):
+def read_predictions(file_name, columns=('ID', 'Ytrue', 'Ypred')):
+    '''
+    Read only the needed columns of a prediction file, with the multi-threaded pyarrow parser when it is installed.
     
-    # load data 
-    df_plot = pd.read_csv(file_name)
+    Args:
+        file_name (str): name of df containing ID (str), Ytrue (int), Ypred (float).
+        columns (tuple): columns to read.
+    Returns:
+        a dataframe with the requested columns.
+    '''
+    try:
+        import pyarrow
+        engine = 'pyarrow'
+    except ImportError:
+        engine = None
     
-    target_mbr = df_plot.loc[df_plot.Ytrue==1, 'ID'] # IDs of true positives
-    k_realPOS = target_mbr.shape[0]                  # true positive size
-    k_total = df_plot.shape[0]                       # population size
+    return pd.read_csv(file_name, usecols=list(columns), engine=engine)
 
-    pct_to_pick = np.arange(.05, 1.05, 0.05)
-    tpr_decile = np.zeros(len(pct_to_pick))
+def get_pct_to_pick(step):
+    '''
+    Fractions of the population picked at each lift point: step, 2 * step, ... up to 1.
+    
+    np.arange(step, 1 + step, step) can end past 1 through rounding, e.g. on 1.05 for
+    step=0.05, the last point is therefore capped at 1 and never repeated.
+    
+    Args:
+        step (float): fraction of the population added at each point.
+    Returns:
+        an array of increasing fractions, the last one 1.
+    '''
+    n_points = int(np.ceil(round(1 / step, 9)))
+    
+    return np.minimum(np.arange(1, n_points + 1) * step, 1.0)
 
-    for i in range(len(pct_to_pick)):
-        k_pick = int(np.ceil(pct_to_pick[i] * k_total)) # choosing number of predicted positives
+def _top_k_true_positives(Ytrue, Ypred, step):
+    # sort once by descending Ypred, ties keep their order as in DataFrame.nlargest
+    Ytrue = np.asarray(Ytrue)
+    Ypred = np.asarray(Ypred)
+    k_total = Ytrue.shape[0]
+    
+    # true positives among the top k predicted, for every k
+    order = np.argsort(-Ypred, kind='stable')
+    tp_top_k = np.cumsum(Ytrue[order] == 1)
+    k_realPOS = int(tp_top_k[-1]) if k_total else 0
+    
+    if step is None:
+        k_pick = np.arange(1, k_total + 1)
+        pct_to_pick = k_pick / float(k_total)
+    else:
+        pct_to_pick = get_pct_to_pick(step)
+        k_pick = np.minimum(np.ceil(pct_to_pick * k_total).astype(np.int64), k_total)
+    
+    return pct_to_pick, k_pick, tp_top_k[k_pick - 1], k_realPOS, k_total
 
-        # Identify the top k_pick predicted members (candidate members).
-        k_pick_mbrID = df_plot.nlargest(k_pick, 'Ypred').ID
+def get_cumgains_lift(Ytrue, Ypred, step=0.05):
+    '''
+    Cumulative gains of the top scored fraction of the population, from a single sort.
+    
+    Rows are sorted once by descending Ypred and the true positives in the top k rows
+    are read off a cumulative sum of Ytrue, for any number of points.
+    
+    Args:
+        Ytrue (array): true labels, 1 for positives.
+        Ypred (array): predicted scores.
+        step (float): fraction of the population added at each point, None for every row.
+    Returns:
+        pct_to_pick (array): fractions of the population picked.
+        tpr_decile (array): fraction of the positives found in the picked population (gains), lift is tpr_decile / pct_to_pick.
+        k_realPOS (int): number of positives.
+        k_total (int): population size.
+    '''
+    pct_to_pick, _, tp, k_realPOS, k_total = _top_k_true_positives(Ytrue, Ypred, step)
+    
+    return pct_to_pick, tp / float(k_realPOS), k_realPOS, k_total
 
-        # Check how many target members are included in our list of candidates (True Positives).
-        tp = k_pick_mbrID.isin(target_mbr).sum() # number of true positives when we select by top x% predicted
+def get_lift_table(file_name, step=0.05):
+    '''
+    Gains and lift table of a prediction file.
+    
+    Args:
+        file_name (str): name of df containing ID (str), Ytrue (int), Ypred (float).
+        step (float): fraction of the population added at each row of the table, None for every row.
+    Returns:
+        a dataframe with pct_to_pick, k_pick, true_positives, gains and lift.
+    '''
+    df = read_predictions(file_name, columns=('Ytrue', 'Ypred'))
+    pct_to_pick, k_pick, tp, k_realPOS, k_total = _top_k_true_positives(df['Ytrue'], df['Ypred'], step)
+    
+    return pd.DataFrame({'pct_to_pick'   : pct_to_pick,
+                         'k_pick'        : k_pick,
+                         'true_positives': tp,
+                         'gains'         : tp / float(k_realPOS),
+                         'lift'          : tp / float(k_realPOS) / pct_to_pick})
 
-        # percent true positives at each pct_to_pick. k_realPOS might be lower if chance is lower than random. 
-        tpr_decile[i]  = tp / float(k_realPOS) 
+def plot_cumgains_lift(file_name, label, random=0.50, color='orange', step=0.05):
+    '''
+    Args:
+        file_name (str): name of df containing ID (str), Ytrue (int), Ypred (float).
+        label (str): legend label of the model.
+        random (float): legend value of the random guess.
+        color (str): line color of the model.
+        step (float): fraction of the population added at each point, see get_cumgains_lift.
+    Returns:
+        pct_to_pick, tpr_decile, k_realPOS, k_total as returned by get_cumgains_lift, after plotting the gains and lift charts.
+    '''
+    df_plot = read_predictions(file_name, columns=('Ytrue', 'Ypred'))
+    pct_to_pick, tpr_decile, k_realPOS, k_total = get_cumgains_lift(df_plot['Ytrue'], df_plot['Ypred'], step=step)
+    
+    render_cumgains_lift(pct_to_pick, tpr_decile, label, random=random, color=color)
+    plt.show();
     
-    plt.figure(figsize=(16,7))
+    return pct_to_pick, tpr_decile, k_realPOS, k_total
+
+def render_cumgains_lift(pct_to_pick, tpr_decile, label, random=0.50, color='orange'):
+    '''
+    Draw the cumulative gains and lift charts of get_cumgains_lift output on a new figure.
+    
+    Args:
+        pct_to_pick, tpr_decile (array): output of get_cumgains_lift.
+        label (str): legend label of the model.
+        random (float): legend value of the random guess.
+        color (str): line color of the model.
+    Returns:
+        the matplotlib figure.
+    '''
+    # markers hide the curve when every row is a point
+    marker = 'o' if len(pct_to_pick) <= 100 else None
+    
+    fig = plt.figure(figsize=(16,7))
     lw = 2
 
     # lift chart
     ax1 = plt.subplot(122)
-    ax1.plot(pct_to_pick, tpr_decile / pct_to_pick, color=color, marker='o', linestyle='--', markersize=8,
+    ax1.plot(pct_to_pick, tpr_decile / pct_to_pick, color=color, marker=marker, linestyle='--', markersize=8,
              lw=lw, label=label)
     
     # lift chart random guess
     ax1.plot(pct_to_pick, 
              np.ones(len(pct_to_pick)), 
              color='black', 
-             marker='*', 
+             marker=marker and '*', 
              markersize=8, 
              lw=lw, 
              linestyle='--', 
@@ -75,12 +177,12 @@ def plot_cumgains_lift(file_name, label, random=0.50, color='orange'):
     ax2 = plt.subplot(121)
     ax2.plot(np.append(np.zeros(1), pct_to_pick), 
              np.append(np.zeros(1), tpr_decile), 
-             color=color, marker='o', linestyle='--', markersize=8, lw=lw, label=label)
+             color=color, marker=marker, linestyle='--', markersize=8, lw=lw, label=label)
     
     # Cumulative Gains Chart random guess
     ax2.plot(np.append(np.zeros(1), pct_to_pick), 
              np.append(np.zeros(1), pct_to_pick),
-             color='black', marker='*', markersize=8, linestyle='--', 
+             color='black', marker=marker and '*', markersize=8, linestyle='--', 
              lw=lw, label=f'Random {random}')
     
     ax2.set_xlim([0, 1.0])
@@ -90,9 +192,7 @@ def plot_cumgains_lift(file_name, label, random=0.50, color='orange'):
     ax2.set_title('Cumulative Gains Chart', fontsize=12, fontweight='bold')
     ax2.legend(loc='lower right')
     
-    plt.show();
-    
-    return pct_to_pick, tpr_decile, k_realPOS, k_total
+    return fig
 
 #******************************************************************************
 # Plot area under the curve: roc, pr
@@ -105,7 +205,22 @@ def plot_aucroc_aucpr(file_name):
     Returns:
         two plots: auc roc curve, auc pr curve with their respecitive best threholds.
     ''' 
-    df = pd.read_csv(file_name)
+    df = read_predictions(file_name, columns=('Ytrue', 'Ypred'))
+    
+    render_aucroc_aucpr(df['Ytrue'], df['Ypred'])
+    plt.show()
+
+def render_aucroc_aucpr(Ytrue, Ypred):
+    '''
+    Draw the auc roc and auc pr curves with their best thresholds on a new figure.
+    
+    Args:
+        Ytrue (array): true labels, 1 for positives.
+        Ypred (array): predicted scores.
+    Returns:
+        the matplotlib figure.
+    '''
+    df = pd.DataFrame({'Ytrue': np.asarray(Ytrue), 'Ypred': np.asarray(Ypred)})
 
     # calculate the fpr and tpr at each threshold of the classification
     fpr_model, tpr_model, AUC_thresholds = roc_curve(df['Ytrue'], df['Ypred'])
@@ -123,7 +238,7 @@ def plot_aucroc_aucpr(file_name):
     # locate the index of the largest f score
     PR_ix = argmax(fscore)
     
-    plt.figure(figsize=(16,7))
+    fig = plt.figure(figsize=(16,7))
     lw = 2
     
     # create subplot: auc roc plot
@@ -177,28 +292,86 @@ def plot_aucroc_aucpr(file_name):
     ax2.set_title('Precision-Recall Curve', fontsize=12, fontweight='bold')
     ax2.legend(loc='upper right')
 
-    plt.show()
+    return fig
 
 #******************************************************************************
 # Confusion Matrix
 #******************************************************************************
 
-def get_confusion_matrix(file_name, model_name, thresh=0.50):
+def get_threshold_sweep(Ytrue, Ypred):
+    '''
+    Confusion matrix counts and metrics at every distinct threshold, from a single sort.
+    
+    At each distinct value of Ypred taken as threshold, Ypred greater than the threshold is
+    classified as 1, as in get_confusion_matrix. Counts are read off cumulative sums of the
+    scores sorted in descending order.
+    
+    Args:
+        Ytrue (array): true labels, 1 for positives.
+        Ypred (array): predicted scores.
+    Returns:
+        a dataframe with thresh, tp, fp, tn, fn, precision, sensitivity, specificity and lift
+        (precision over chance), one row per distinct threshold in descending order.
+    '''
+    Ytrue = np.asarray(Ytrue)
+    Ypred = np.asarray(Ypred)
+    
+    order = np.argsort(-Ypred, kind='stable')
+    Ypred_sorted = Ypred[order]
+    cum_pos = np.cumsum(Ytrue[order] == 1)
+    
+    # last row of each run of equal scores
+    ends = np.flatnonzero(np.append(Ypred_sorted[1:] != Ypred_sorted[:-1], True))
+    
+    # rows strictly above each threshold are those before its run
+    predicted_positive = np.append(0, ends[:-1] + 1)
+    tp = np.append(0, cum_pos[ends[:-1]])
+    fp = predicted_positive - tp
+    actual_positive = cum_pos[-1]
+    actual_negative = len(Ypred) - actual_positive
+    fn = actual_positive - tp
+    tn = actual_negative - fp
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        precision = tp / predicted_positive
+        target_pct = actual_positive / float(len(Ypred))
+        
+        return pd.DataFrame({'thresh'     : Ypred_sorted[ends],
+                             'tp'         : tp,
+                             'fp'         : fp,
+                             'tn'         : tn,
+                             'fn'         : fn,
+                             'precision'  : precision,
+                             'sensitivity': tp / float(actual_positive),
+                             'specificity': tn / float(actual_negative),
+                             'lift'       : precision / target_pct})
+
+def get_threshold_table(file_name):
+    '''
+    Args:
+        file_name (str): name of df containing ID (str), Ytrue (int), Ypred (float).
+    Returns:
+        the get_threshold_sweep table of the prediction file.
+    '''
+    df = read_predictions(file_name, columns=('Ytrue', 'Ypred'))
+    
+    return get_threshold_sweep(df['Ytrue'], df['Ypred'])
+
+def get_confusion_matrix(file_name, model_name=None, thresh=0.50):
     '''
     If the argument `thresh` isnt't passed in, the default 0.50 is used.
     
     Args:
         file_name (str):  name of df containing ID (str), Ytrue (int), Ypred (float).
-        model_name (str): name of saved model.
+        model_name (str): unused, kept for existing callers. The model is not loaded.
         thresh (float): value to classify all Ypred greater than threshold as 1 and lesser than threshold as 0.
     Prints:
         performance metrics of the classification model for which true values are known.
     Returns:
         a dataframe with actual values as rows and predicted values as columns.
     ''' 
-    # load data and model
-    df = pd.read_csv(file_name)
-    fitted_model = pickle.load(open(model_name, "rb"))
+    # load data
+    df = read_predictions(file_name, columns=('Ytrue', 'Ypred'))
 
     # Get confusion matrix at desired threshold
     target_pct = (df['Ytrue'].value_counts()[1]/df['Ytrue'].shape[0])
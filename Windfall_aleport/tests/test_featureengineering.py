@@ -0,0 +1,109 @@
+from Windfall_aleport.notebooks.preprocess.featureengineering import create_features_df_donations, create_features_df_donations_multi, optimize_dtypes
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def baseline_create_features_df_donations(df, PredictedOn='2016-08-01'):
+    '''
+    the apply based create_features_df_donations the vectorized one replaced, with the
+    set_axis and groupby sum spelled the way current pandas accepts them.
+    '''
+    df = df.dropna(how='any', axis=0).reset_index(drop=True)
+    df = df.set_axis(['candidate_id', 'trans_date', 'amount'], axis=1)
+    df['trans_date'] = pd.to_datetime(df['trans_date'])
+    df['DaysFromPrediction'] = (df['trans_date'] - pd.to_datetime(PredictedOn)).dt.days
+
+    for k, (upper, lower) in zip(range(2, 6), [(-360, -720), (-720, -1080), (-1080, -1440), (-1440, -1800)]):
+        df['count_trans_date_prev360d%d' % k] = df['DaysFromPrediction'].apply(lambda x: 1 if x < upper and x >= lower else 0)
+    for k in range(2, 6):
+        df['amount_prev360d%d' % k] = np.where(df['count_trans_date_prev360d%d' % k] == 1, df['amount'], 0)
+
+    df_addfeatures = df.drop(columns=['trans_date']).groupby('candidate_id').agg('sum').iloc[:, 2:].reset_index()
+    df_addfeatures['count_trans_date_prev5y'] = df_addfeatures.iloc[:, 1:6].sum(axis=1)
+    df_addfeatures.drop(columns=['count_trans_date_prev360d2', 'count_trans_date_prev360d3',
+                                 'count_trans_date_prev360d4', 'count_trans_date_prev360d5'], inplace=True)
+
+    return df_addfeatures
+
+
+PREDICTED_ON = '2016-08-01'
+
+
+class TestDonationFeatures:
+    @pytest.fixture
+    def donations(self):
+        predicted_on = pd.Timestamp(PREDICTED_ON)
+        rows = [
+            # every window edge and the days next to it
+            *[(1, predicted_on + pd.Timedelta(days=d), 10.0 + i)
+              for i, d in enumerate([0, -359, -360, -361, -719, -720, -721, -1080, -1440, -1799, -1800, -1801])],
+            # donations only after the prediction date or before the oldest window
+            (2, predicted_on + pd.Timedelta(days=5), 50.0),
+            (2, predicted_on - pd.Timedelta(days=4000), 60.0),
+            # dropped by clean_dataset
+            (3, predicted_on - pd.Timedelta(days=400), np.nan),
+            (3, predicted_on - pd.Timedelta(days=800), 25.25),
+            (4, predicted_on - pd.Timedelta(days=365), 0.1),
+            (4, predicted_on - pd.Timedelta(days=365), 0.2),
+        ]
+        df = pd.DataFrame(rows, columns=['cand_id', 'trans_date', 'amount'])
+        df['trans_date'] = df['trans_date'].dt.strftime('%Y-%m-%d')
+        return df
+
+    def test_matches_baseline(self, donations):
+        for predicted_on in [PREDICTED_ON, '2015-01-01', '2020-01-01']:
+            expected = baseline_create_features_df_donations(donations.copy(), PredictedOn=predicted_on)
+            result = create_features_df_donations(donations.copy(), PredictedOn=predicted_on)
+            pd.testing.assert_frame_equal(result, expected)
+
+    def test_count_trans_date_prev5y_includes_amount_prev360d2(self, donations):
+        result = create_features_df_donations(donations, PredictedOn=PREDICTED_ON).set_index('candidate_id')
+        # two donations in prev360d2 whose amounts sum to 0.3, counted as 2 + 0.3
+        assert result.loc[4, 'count_trans_date_prev5y'] == pytest.approx(2.3)
+        # no donation in any window
+        assert (result.loc[2] == 0).all()
+
+    def test_multi_matches_single_date(self, donations):
+        dates = [PREDICTED_ON, '2015-01-01', '2020-01-01']
+        result = create_features_df_donations_multi(donations.copy(), dates)
+        for predicted_on in dates:
+            expected = create_features_df_donations(donations.copy(), PredictedOn=predicted_on)
+            result_date = result[result['PredictedOn'] == pd.Timestamp(predicted_on)].drop(columns='PredictedOn')
+            pd.testing.assert_frame_equal(result_date.reset_index(drop=True), expected)
+
+    def test_multi_rejects_windows_after_prediction(self, donations):
+        with pytest.raises(ValueError):
+            create_features_df_donations_multi(donations, [PREDICTED_ON], windows=[('next360d', 0, 360)])
+
+
+class TestOptimizeDtypes:
+    @pytest.fixture
+    def df(self):
+        return pd.DataFrame({
+            'cand_id': ['a', 'b', 'a', 'b', 'a', 'b'],
+            'state': ['CA', 'NY', 'CA', 'NY', 'CA', 'NY'],
+            'count': np.array([1, 2, 3, 4, 5, 6], dtype=np.int64),
+            'amount': [0.5, 1.5, 2.5, 3.5, 4.5, 5.5],
+            'ratio': [0.1, 0.2, 0.3, 0.4, 0.5, 0.6],
+        })
+
+    def test_downcast(self, df):
+        result, report = optimize_dtypes(df)
+
+        assert isinstance(result['state'].dtype, pd.CategoricalDtype)
+        assert result['count'].dtype == np.int8
+        # 0.5 steps are exact in float32, tenths are not
+        assert result['amount'].dtype == np.float32
+        assert result['ratio'].dtype == np.float64
+        assert report['bytes_after'] < report['bytes_before']
+        pd.testing.assert_frame_equal(result.astype(df.dtypes.to_dict()), df)
+
+    def test_id_columns_left_alone(self, df):
+        result, report = optimize_dtypes(df)
+        assert result['cand_id'].dtype == df['cand_id'].dtype
+        assert 'cand_id' not in report['columns_changed']
+
+        result, _ = optimize_dtypes(df, id_columns=['state'])
+        assert result['state'].dtype == df['state'].dtype
+        assert isinstance(result['cand_id'].dtype, pd.CategoricalDtype)
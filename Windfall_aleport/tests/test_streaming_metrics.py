@@ -0,0 +1,30 @@
+from Windfall_aleport.notebooks.visualization.streaming_metrics import ScoreHistogram
+from sklearn.metrics import average_precision_score
+import numpy as np
+import pytest
+
+
+class TestScoreHistogram:
+    @pytest.fixture
+    def scores(self):
+        rng = np.random.default_rng(0)
+        Ytrue = rng.integers(0, 2, 2000)
+        Ypred = np.clip(0.3 * Ytrue + rng.uniform(0, 0.7, 2000), 0, 1)
+        return Ytrue, Ypred
+
+    def test_nan_scores_counted_as_missing(self, scores):
+        Ytrue, Ypred = scores
+        with_nan = np.append(Ypred, [np.nan, np.nan])
+        hist = ScoreHistogram(n_bins=100).update(np.append(Ytrue, [1, 0]), with_nan)
+        expected = ScoreHistogram(n_bins=100).update(Ytrue, Ypred)
+
+        assert hist.n_missing == 2
+        np.testing.assert_array_equal(hist.pos, expected.pos)
+        np.testing.assert_array_equal(hist.neg, expected.neg)
+        assert hist.merge(expected).n_missing == 2
+
+    def test_pr_auc_within_bounds(self, scores):
+        Ytrue, Ypred = scores
+        hist = ScoreHistogram(n_bins=50).update(Ytrue, Ypred)
+        low, high = hist.pr_auc_bounds()
+        assert low <= average_precision_score(Ytrue, Ypred) <= high